@@ -53,10 +53,10 @@ def process_command(cmd, ancestors=[]):
         cmd_str += a.name + ' '
     cmd_str += cmd.name
     command_list.append(cmd_str)
-    if type(cmd) == click.core.Group:
-        for k in sorted(cmd.commands.keys()):
+    if isinstance(cmd, click.core.Group):
+        for k in cmd.list_commands(None):
             a = ancestors + [cmd]
-            process_command(cmd.commands[k], ancestors=a)
+            process_command(cmd.get_command(None, k), ancestors=a)
 
 
 try:
@@ -2,5 +2,6 @@
 
 ./cleanup.sh
 python setup.py develop
+python -m vcd_cli.command_manifest
 python setup.py sdist bdist_wheel
 twine upload dist/*
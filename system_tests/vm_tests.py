@@ -13,8 +13,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from click.testing import CliRunner
+import re
+from unittest import mock
+from uuid import uuid1
 
+from click.testing import CliRunner
 from pyvcloud.system_test_framework.base_test import BaseTestCase
 from pyvcloud.system_test_framework.vapp_constants import VAppConstants
 from pyvcloud.system_test_framework.environment import CommonRoles
@@ -29,15 +32,15 @@ from pyvcloud.vcd.client import RelationType
 from pyvcloud.vcd.client import TaskStatus
 from pyvcloud.vcd.vapp import VApp
 from pyvcloud.vcd.vm import VM
-from uuid import uuid1
+import requests
+
 from vcd_cli.vcd import vcd  # NOQA
 from vcd_cli.login import login, logout
 from vcd_cli.org import org
 from vcd_cli.vdc import vdc
+import vcd_cli.vm
 from vcd_cli.vm import vm
 
-import re
-
 
 class VmTest(BaseTestCase):
     """Test VM related commands
@@ -203,6 +206,55 @@ class VmTest(BaseTestCase):
         self.assertTrue(re.findall(vm_name_regex, result.output))
         self.assertTrue(re.findall(vapp_regex, result.output))
 
+    def test_0011_resolve_vm_with_one_request(self):
+        """Resolve a VM by vApp and VM name with a single request."""
+        counter = {'resolving': False, 'requests': 0}
+        session_request = requests.Session.request
+        get_vm = vcd_cli.vm._get_vm
+
+        def count_request(session, method, url, **kwargs):
+            if counter['resolving']:
+                counter['requests'] += 1
+            return session_request(session, method, url, **kwargs)
+
+        def count_get_vm(ctx, vapp_name, vm_name):
+            counter['resolving'] = True
+            try:
+                return get_vm(ctx, vapp_name, vm_name)
+            finally:
+                counter['resolving'] = False
+
+        with mock.patch.object(requests.Session, 'request',
+                               count_request), \
+                mock.patch.object(vcd_cli.vm, '_get_vm', count_get_vm):
+            # the first run caches the query list of the host
+            for n in range(2):
+                counter['requests'] = 0
+                result = VmTest._runner.invoke(
+                    vm,
+                    args=['info', VAppConstants.name, VAppConstants.vm1_name])
+                self.assertEqual(0, result.exit_code)
+        self.assertEqual(1, counter['requests'])
+
+    def test_0012_list_with_or_filter(self):
+        """List VMs with a filter whose terms are OR-ed.
+
+        The filter must not widen the list beyond the VMs of the vdc in
+        use, which all match it.
+        """
+        result = VmTest._runner.invoke(vm, args=['list', '--count'])
+        self.assertEqual(0, result.exit_code)
+        result_or = VmTest._runner.invoke(
+            vm,
+            args=[
+                'list', '--count', '--filter',
+                'numberOfCpus=gt=0,memoryMB=gt=0'
+            ])
+        self.assertEqual(0, result_or.exit_code)
+        self.assertEqual(result.output, result_or.output)
+        result = VmTest._runner.invoke(vm, args=['list', '--limit', '-1'])
+        self.assertNotEqual(0, result.exit_code)
+
     def test_0020_consolidate(self):
         """Consolidate the VM."""
         default_org = self._config['vcd']['default_org_name']
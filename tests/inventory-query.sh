@@ -0,0 +1,46 @@
+#!/usr/bin/env bash
+
+# Inventory query test.
+#
+# Fills an in-memory inventory with a few VM records and checks the rows
+# returned by inventory_index.query_inventory() for filters combining
+# ';' (and), ',' (or), wildcards and --name.
+
+set -e
+
+python - <<'EOF'
+import sqlite3
+
+from lxml import etree
+
+from vcd_cli.inventory_index import _insert_records
+from vcd_cli.inventory_index import query_inventory
+
+conn = sqlite3.connect(':memory:')
+conn.row_factory = sqlite3.Row
+_insert_records(conn, 'vm', [
+    etree.Element('VMRecord', href='https://vcd/api/vApp/vm-%s' % name,
+                  name=name, status=status, memoryMB=memory)
+    for name, status, memory in [('a', 'ON', '1024'), ('b', 'OFF', '2048'),
+                                 ('c', 'OFF', '4096'), ('web-1', 'ON', '8192')]
+])
+
+cases = [
+    ('status==ON', None, ['a', 'web-1']),
+    ('status==ON,status==OFF', 'a', ['a']),
+    ('status==OFF;memoryMB=gt=2048,name==a', None, ['a', 'c']),
+    ('status==OFF;memoryMB=gt=2048,name==a', 'c', ['c']),
+    ('name==web-*', None, ['web-1']),
+    ('name!=web-*;memoryMB=ge=2048', None, ['b', 'c']),
+]
+failed = False
+for qfilter, name, expected in cases:
+    names = sorted(r['name'] for r in query_inventory(
+        conn, 'vm', qfilter=qfilter, name=name))
+    ok = names == expected
+    failed = failed or not ok
+    print('%-40s %-6s %s  %s' % (qfilter, name or '', 'ok  ' if ok else
+                                 'FAIL', ','.join(names)))
+if failed:
+    raise SystemExit(1)
+EOF
@@ -0,0 +1,39 @@
+#!/usr/bin/env bash
+
+# Startup time benchmark.
+#
+# Compares the time it takes to import the whole command tree, which is what
+# every invocation paid before command modules were loaded on demand, with
+# the time taken by a few commands that only load the modules they need.
+# 'vcd pwd' and 'vcd vm info' don't need to be logged in to be measured, the
+# interesting part is how long it takes to get to restore the session.
+
+set -e
+
+RUNS=${RUNS:-10}
+
+python - $RUNS <<'EOF'
+import subprocess
+import sys
+import time
+
+runs = int(sys.argv[1])
+full_tree = 'from vcd_cli.vcd import vcd\n' \
+            'for name in vcd.list_commands(None):\n' \
+            '    vcd.get_command(None, name)\n'
+cases = [
+    ('import all commands', [sys.executable, '-c', full_tree]),
+    ('vcd version', ['vcd', 'version']),
+    ('vcd pwd', ['vcd', 'pwd']),
+    ('vcd vm info', ['vcd', 'vm', 'info', 'vapp1', 'vm1']),
+]
+print('%-22s %10s %10s' % ('command', 'best (ms)', 'avg (ms)'))
+for name, cmd in cases:
+    times = []
+    for n in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    print('%-22s %10.0f %10.0f' % (name, min(times), sum(times) / runs))
+EOF
@@ -0,0 +1,65 @@
+#!/usr/bin/env bash
+
+# Table rendering benchmark.
+#
+# Times how long it takes to format 1k, 10k and 100k query-like records as a
+# table with utils.as_table() and utils.as_table_stream(), and with tabulate,
+# which as_table() used to hand every table to.
+
+set -e
+
+RUNS=${RUNS:-3}
+
+python - $RUNS <<'EOF'
+import sys
+import time
+
+from tabulate import tabulate
+
+from vcd_cli.utils import as_table
+from vcd_cli.utils import as_table_stream
+
+runs = int(sys.argv[1])
+
+
+def make_records(count):
+    return [{
+        'name': 'vm-%06d' % n,
+        'containerName': 'vapp-%d' % (n % 97),
+        'status': 'POWERED_ON' if n % 3 else 'POWERED_OFF',
+        'numberOfCpus': str(1 + n % 8),
+        'memoryMB': str(512 * (1 + n % 16)),
+        'guestOs': 'Ubuntu Linux (64-bit)',
+        'vdcName': 'vdc-%d' % (n % 5),
+        'href': 'https://vcd.example.com/api/vApp/vm-%d' % n
+    } for n in range(count)]
+
+
+def tabulate_table(records):
+    headers = sorted(k for k in records[0].keys() if k != 'href')
+    return tabulate([[r.get(k, '') for k in headers] for r in records],
+                    headers)
+
+
+def stream_table(records):
+    for line in as_table_stream(iter(records)):
+        pass
+
+
+cases = [
+    ('tabulate', tabulate_table),
+    ('as_table', as_table),
+    ('as_table_stream', stream_table),
+]
+print('%-16s %8s %10s %10s' % ('renderer', 'rows', 'best (ms)', 'avg (ms)'))
+for count in [1000, 10000, 100000]:
+    records = make_records(count)
+    for name, render in cases:
+        times = []
+        for n in range(runs):
+            start = time.perf_counter()
+            render(records)
+            times.append((time.perf_counter() - start) * 1000)
+        print('%-16s %8d %10.0f %10.0f' % (name, count, min(times),
+                                           sum(times) / runs))
+EOF
@@ -0,0 +1,170 @@
+# vCloud CLI 0.1
+#
+# Copyright (c) 2014-2018 VMware, Inc. All Rights Reserved.
+#
+# This product is licensed to you under the
+# Apache License, Version 2.0 (the "License").
+# You may not use this product except in compliance with the License.
+#
+# This product may include a number of subcomponents with
+# separate copyright notices and license terms. Your use of the source
+# code for the these subcomponents is subject to the terms and
+# conditions of the subcomponent's license, as noted in the LICENSE file.
+#
+
+import io
+import json
+import shlex
+import sys
+import time
+import traceback
+
+import click
+
+from vcd_cli.utils import enable_session_cache
+from vcd_cli.utils import stderr
+from vcd_cli.vcd import run_command
+from vcd_cli.vcd import vcd
+
+
+def _root_args(ctx):
+    """Get the options given to vcd, so that each line runs with them.
+
+    :rtype: list
+    """
+    root = ctx.find_root()
+    args = []
+    for param in root.command.params:
+        if not isinstance(param, click.Option):
+            continue
+        # the task options are stored in ctx.meta, see vcd_cli.vcd
+        value = root.params.get(param.name, ctx.meta.get(param.name))
+        if value is None or value == param.default:
+            continue
+        if param.is_flag and param.secondary_opts and not value:
+            args.append(param.secondary_opts[0])
+        elif param.is_flag:
+            args.append(param.opts[0])
+        else:
+            args.extend([param.opts[-1], str(value)])
+    return args
+
+
+def _run_captured(args):
+    saved_streams = (sys.stdout, sys.stderr)
+    sys.stdout = io.StringIO()
+    sys.stderr = io.StringIO()
+    try:
+        exit_code = run_command(args)
+    except Exception:
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        output = sys.stdout.getvalue()
+        error = sys.stderr.getvalue()
+        sys.stdout, sys.stderr = saved_streams
+    return exit_code, output, error
+
+
+@vcd.command(short_help='run commands from a file')
+@click.pass_context
+@click.argument(
+    'input_file',
+    metavar='<file>',
+    type=click.File('r'),
+    required=True)
+@click.option(
+    '-e',
+    '--stop-on-error',
+    is_flag=True,
+    default=False,
+    help='Stop at the first command that fails')
+@click.option(
+    '--json-lines',
+    'json_lines',
+    is_flag=True,
+    default=False,
+    help='Print the result of each command as a JSON object per line')
+def batch(ctx, input_file, stop_on_error, json_lines):
+    """Run many vcd commands in a single process.
+
+\b
+    Description
+        Reads one vcd command per line from a file, or from the standard
+        input when the file is '-', and runs them in order. All commands
+        share the same session and connections to vCloud Director, so
+        the session is only restored once.
+\b
+        Each line has the arguments of a vcd command, optionally preceded
+        by 'vcd'. Empty lines and lines starting with '#' are ignored.
+        Lines are split like a shell would, but there is no variable or
+        command substitution. A line that can't be split, like one with an
+        unbalanced quote, fails with exit code 1. The options given to vcd,
+        like --json, apply to every command.
+\b
+        The exit code of each command is printed on the standard error
+        after it runs. With --json-lines, the output of each command is
+        captured and printed as a JSON object with the fields 'line',
+        'command', 'exit_code', 'duration_ms', 'output' and 'error'
+        instead.
+\b
+        The exit code is 0 when all commands succeed, 1 otherwise.
+\b
+    Examples
+        vcd batch commands.txt
+            Run the commands in the file 'commands.txt'.
+\b
+        printf 'org use org1\\nvdc list\\n' | vcd batch -
+            Run the commands read from the standard input.
+\b
+        vcd batch --stop-on-error --json-lines commands.txt
+            Run the commands until one fails, printing a JSON object per
+            command.
+    """
+    try:
+        enable_session_cache()
+        root_args = _root_args(ctx)
+        failed = False
+        for line_number, line in enumerate(input_file, 1):
+            line = line.strip()
+            if len(line) == 0 or line.startswith('#'):
+                continue
+            start = time.time()
+            try:
+                args = shlex.split(line)
+            except ValueError as e:
+                args = None
+                exit_code, output = 1, ''
+                error = 'Error: invalid command line: %s\n' % e
+            if args is not None:
+                if args[0] == 'vcd':
+                    args = args[1:]
+                args = root_args + args
+                if json_lines:
+                    exit_code, output, error = _run_captured(args)
+                else:
+                    exit_code = run_command(args)
+            if json_lines:
+                click.echo(json.dumps({
+                    'line': line_number,
+                    'command': line,
+                    'exit_code': exit_code,
+                    'duration_ms': int((time.time() - start) * 1000),
+                    'output': output,
+                    'error': error
+                }))
+            else:
+                if args is None:
+                    click.echo(error, err=True, nl=False)
+                click.echo('line %d, exit code %d: %s' %
+                           (line_number, exit_code, line), err=True)
+            if exit_code != 0:
+                failed = True
+                if stop_on_error:
+                    break
+        if failed:
+            ctx.exit(1)
+    except click.exceptions.Exit:
+        raise
+    except Exception as e:
+        stderr(e, ctx)
@@ -10,6 +10,7 @@
 # conditions of the subcomponent's license, as noted in the LICENSE file.
 #
 
+import itertools
 import os
 
 import click
@@ -18,10 +19,16 @@ from pyvcloud.vcd.client import ResourceType
 from pyvcloud.vcd.exceptions import AccessForbiddenException
 from pyvcloud.vcd.org import Org
 from pyvcloud.vcd.utils import access_settings_to_dict
+from pyvcloud.vcd.utils import filter_attributes
 from pyvcloud.vcd.utils import to_dict
 from pyvcloud.vcd.utils import vapp_to_dict
 from pyvcloud.vcd.vapp import VApp
 
+from vcd_cli.href_cache import invalidate_href
+from vcd_cli.href_cache import resolve_resource
+from vcd_cli.query import count_records
+from vcd_cli.query import parse_fields
+from vcd_cli.query import query_records
 from vcd_cli.utils import access_settings_to_list
 from vcd_cli.utils import acl_str_to_list_of_dict
 from vcd_cli.utils import is_sysadmin
@@ -103,7 +110,9 @@ def info(ctx, catalog_name, item_name):
         in_use_org_href = ctx.obj['profiles'].get('org_href')
         org = Org(client, in_use_org_href)
         if item_name is None:
-            catalog = org.get_catalog(catalog_name)
+            catalog = resolve_resource(
+                ctx, 'catalog', catalog_name,
+                lambda: org.get_catalog(catalog_name))
             result = to_dict(catalog)
             # We don't have a way to know in advance if a user has access to a
             # catalog's ACL or not. So we try to retrieve it always. If the
@@ -153,6 +162,8 @@ def update(ctx, catalog_name, new_catalog_name, description):
         in_use_org_href = ctx.obj['profiles'].get('org_href')
         org = Org(client, in_use_org_href)
         org.update_catalog(catalog_name, new_catalog_name, description)
+        if new_catalog_name is not None:
+            invalidate_href(ctx, 'catalog', catalog_name)
         stdout('Catalog update successful', ctx)
     except Exception as e:
         stderr(e, ctx)
@@ -161,7 +172,18 @@ def update(ctx, catalog_name, new_catalog_name, description):
 @catalog.command('list', short_help='list catalogs or items')
 @click.pass_context
 @click.argument('catalog-name', metavar='[catalog-name]', required=False)
-def list_catalogs_or_items(ctx, catalog_name):
+@click.option(
+    '--fields',
+    required=False,
+    default=None,
+    metavar='<attribute,...>',
+    help='only get these attributes of the catalog items')
+@click.option(
+    '--count',
+    is_flag=True,
+    default=False,
+    help='only show the number of catalog items')
+def list_catalogs_or_items(ctx, catalog_name, fields, count):
     try:
         restore_session(ctx)
         client = ctx.obj['client']
@@ -170,21 +192,34 @@ def list_catalogs_or_items(ctx, catalog_name):
             org = Org(client, in_use_org_href)
             result = org.list_catalogs()
         else:
-            result = []
             if is_sysadmin(ctx):
                 resource_type = ResourceType.ADMIN_CATALOG_ITEM.value
             else:
                 resource_type = ResourceType.CATALOG_ITEM.value
-            q = client.get_typed_query(
+            if count:
+                n = count_records(
+                    ctx,
+                    resource_type,
+                    equality_filter=('catalogName', catalog_name),
+                    query_result_format=QueryResultFormat.ID_RECORDS)
+                stdout({'count': n}, ctx, alt_text=str(n))
+                return
+            fields = parse_fields(fields)
+            records = query_records(
+                ctx,
                 resource_type,
-                query_result_format=QueryResultFormat.ID_RECORDS,
-                equality_filter=('catalogName', catalog_name))
-            records = list(q.execute())
-            if len(records) == 0:
+                equality_filter=('catalogName', catalog_name),
+                fields=fields or filter_attributes(resource_type),
+                query_result_format=QueryResultFormat.ID_RECORDS)
+            first = next(records, None)
+            if first is None:
                 result = 'not found'
+            elif fields is None:
+                result = (to_dict(r, resource_type=resource_type)
+                          for r in itertools.chain([first], records))
             else:
-                for r in records:
-                    result.append(to_dict(r, resource_type=resource_type))
+                result = (to_dict(r, attributes=fields)
+                          for r in itertools.chain([first], records))
         stdout(result, ctx)
     except Exception as e:
         stderr(e, ctx)
@@ -226,6 +261,7 @@ def delete_catalog_or_item(ctx, catalog_name, item_name):
         org = Org(client, in_use_org_href)
         if item_name is None:
             org.delete_catalog(catalog_name)
+            invalidate_href(ctx, 'catalog', catalog_name)
             stdout('Catalog deleted.', ctx)
         else:
             org.delete_catalog_item(catalog_name, item_name)
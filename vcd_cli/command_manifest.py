@@ -0,0 +1,173 @@
+# vCloud CLI 0.1
+#
+# Copyright (c) 2014-2018 VMware, Inc. All Rights Reserved.
+#
+# This product is licensed to you under the
+# Apache License, Version 2.0 (the "License").
+# You may not use this product except in compliance with the License.
+#
+# This product may include a number of subcomponents with
+# separate copyright notices and license terms. Your use of the source
+# code for the these subcomponents is subject to the terms and
+# conditions of the subcomponent's license, as noted in the LICENSE file.
+#
+
+"""Prebuilt description of the vcd command tree.
+
+The manifest holds names, short help and parameters of every built-in
+command, so that help, 'vcd help --tree' and shell completion can be served
+without importing the command modules. It is generated from the command tree
+and shipped with the package; regenerate it after adding or changing
+commands with:
+
+    python -m vcd_cli.command_manifest
+"""
+
+import json
+import os
+
+import click
+
+MANIFEST_PATH = os.path.join(os.path.dirname(__file__), 'commands.json')
+MANIFEST_VERSION = 1
+
+_manifest = None
+
+
+def _param_to_dict(param):
+    result = {
+        'name': param.name,
+        'kind': 'option' if isinstance(param, click.Option) else 'argument',
+        'opts': list(param.opts),
+        'secondary_opts': list(param.secondary_opts),
+        'nargs': param.nargs,
+        'required': param.required,
+        'metavar': param.metavar
+    }
+    if isinstance(param.type, click.Choice):
+        result['type'] = 'choice'
+        result['choices'] = list(param.type.choices)
+    elif isinstance(param.type, (click.File, click.Path)):
+        result['type'] = 'path'
+    else:
+        result['type'] = 'string'
+    if isinstance(param, click.Option):
+        result['is_flag'] = param.is_flag
+        result['multiple'] = param.multiple
+        result['hidden'] = param.hidden
+        result['help'] = param.help
+    return result
+
+
+def command_to_dict(cmd):
+    """Describe a click command and its sub-commands as a dictionary."""
+    result = {
+        'short_help': cmd.get_short_help_str(),
+        'hidden': cmd.hidden,
+        # hidden options are neither shown in help nor completed
+        'params': [
+            _param_to_dict(p) for p in cmd.params
+            if not getattr(p, 'hidden', False)
+        ]
+    }
+    if isinstance(cmd, click.Group):
+        result['commands'] = {}
+        for name in cmd.list_commands(None):
+            result['commands'][name] = command_to_dict(
+                cmd.get_command(None, name))
+    return result
+
+
+def build_manifest(group, names):
+    """Build the manifest for the given top level commands of group."""
+    commands = {}
+    for name in names:
+        cmd = group.get_command(None, name)
+        if cmd is not None:
+            commands[name] = command_to_dict(cmd)
+    return {'version': MANIFEST_VERSION, 'commands': commands}
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    with open(path, 'w') as f:
+        json.dump(manifest, f, sort_keys=True, indent=1)
+        f.write('\n')
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """Return the commands in the manifest, None if it can't be used.
+
+    The manifest is read once per process.
+    """
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                _manifest = data['commands']
+            else:
+                _manifest = {}
+        except Exception:
+            _manifest = {}
+    return _manifest or None
+
+
+def _param_from_dict(data):
+    if data['type'] == 'choice':
+        param_type = click.Choice(data['choices'])
+    elif data['type'] == 'path':
+        param_type = click.Path()
+    else:
+        param_type = None
+    if data['kind'] == 'argument':
+        return click.Argument([data['name']],
+                              type=param_type,
+                              nargs=data['nargs'],
+                              required=data['required'],
+                              metavar=data['metavar'])
+    if data['secondary_opts']:
+        opts = [
+            '%s/%s' % pair
+            for pair in zip(data['opts'], data['secondary_opts'])
+        ]
+    else:
+        opts = data['opts']
+    return click.Option([data['name']] + opts,
+                        type=None if data['is_flag'] else param_type,
+                        is_flag=data['is_flag'] or None,
+                        multiple=data['multiple'],
+                        nargs=data['nargs'],
+                        required=data['required'],
+                        metavar=data['metavar'],
+                        hidden=data['hidden'],
+                        help=data['help'])
+
+
+def command_from_dict(name, data):
+    """Create a click command that only describes a manifest entry.
+
+    The command has no callback, it is meant for help and shell completion.
+    """
+    params = [_param_from_dict(p) for p in data['params']]
+    if 'commands' in data:
+        commands = {
+            k: command_from_dict(k, v)
+            for k, v in data['commands'].items()
+        }
+        return click.Group(name,
+                           commands=commands,
+                           params=params,
+                           short_help=data['short_help'],
+                           hidden=data['hidden'])
+    return click.Command(name,
+                         params=params,
+                         short_help=data['short_help'],
+                         hidden=data['hidden'])
+
+
+if __name__ == '__main__':
+    from vcd_cli.vcd import COMMAND_MODULES
+    from vcd_cli.vcd import vcd
+    save_manifest(build_manifest(vcd, sorted(COMMAND_MODULES.keys())))
+    click.echo('command manifest saved to %s' % MANIFEST_PATH)
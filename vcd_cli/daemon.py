@@ -0,0 +1,345 @@
+# vCloud CLI 0.1
+#
+# Copyright (c) 2014-2018 VMware, Inc. All Rights Reserved.
+#
+# This product is licensed to you under the
+# Apache License, Version 2.0 (the "License").
+# You may not use this product except in compliance with the License.
+#
+# This product may include a number of subcomponents with
+# separate copyright notices and license terms. Your use of the source
+# code for the these subcomponents is subject to the terms and
+# conditions of the subcomponent's license, as noted in the LICENSE file.
+#
+
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+
+import click
+
+from vcd_cli.forward import connect
+from vcd_cli.forward import get_command_name
+from vcd_cli.forward import get_socket_path
+from vcd_cli.forward import LOCAL_COMMANDS
+from vcd_cli.forward import recv_frame
+from vcd_cli.forward import send_frame
+from vcd_cli.utils import enable_session_cache
+from vcd_cli.utils import get_session_cache
+from vcd_cli.utils import stderr
+from vcd_cli.utils import stdout
+from vcd_cli.vcd import run_command
+from vcd_cli.vcd import vcd
+
+
+@vcd.group(short_help='manage the vcd daemon')
+@click.pass_context
+def daemon(ctx):
+    """Manage the vcd daemon.
+
+\b
+    Description
+        The vcd daemon is a background process that runs vcd commands on
+        behalf of the vcd command line. It keeps the command modules loaded
+        and the sessions restored, with their connections open, so commands
+        don't pay for starting Python, restoring the session and setting up
+        a new TLS connection every time.
+\b
+        While the daemon is running, vcd forwards its command line to the
+        daemon through the socket ~/.vcd-cli/daemon.sock and relays the
+        input and output of the command. When the daemon is not running,
+        or is running the command of another vcd process, commands run in
+        the vcd process as usual. 'vcd login' always runs in the vcd
+        process.
+\b
+        The daemon is only available on platforms with UNIX sockets.
+\b
+    Examples
+        vcd daemon start
+            Start the daemon in the background.
+\b
+        vcd daemon start --idle-timeout 3600
+            Start the daemon, it exits after one hour without commands.
+\b
+        vcd daemon status
+            Show the status of the daemon.
+\b
+        vcd daemon stop
+            Stop the daemon.
+    """
+    pass
+
+
+class _ForwardedOutput(io.RawIOBase):
+    def __init__(self, sock, frame_type, is_tty):
+        self.sock = sock
+        self.frame_type = frame_type
+        self.is_tty = is_tty
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return self.is_tty
+
+    def write(self, b):
+        send_frame(self.sock, self.frame_type, bytes(b))
+        return len(b)
+
+
+class _ForwardedInput(io.RawIOBase):
+    def __init__(self, sock, is_tty):
+        self.sock = sock
+        self.is_tty = is_tty
+
+    def readable(self):
+        return True
+
+    def isatty(self):
+        return self.is_tty
+
+    def readinto(self, b):
+        send_frame(self.sock, b'I', str(len(b)).encode('ascii'))
+        frame_type, data = recv_frame(self.sock)
+        b[:len(data)] = data
+        return len(data)
+
+    def getpass(self, prompt='Password: ', stream=None):
+        send_frame(self.sock, b'P', prompt.encode('utf-8'))
+        frame_type, data = recv_frame(self.sock)
+        return data.decode('utf-8')
+
+
+def _text_stream(raw, write):
+    if write:
+        return io.TextIOWrapper(
+            io.BufferedWriter(raw),
+            encoding='utf-8',
+            line_buffering=True,
+            write_through=True)
+    return io.TextIOWrapper(io.BufferedReader(raw), encoding='utf-8')
+
+
+class DaemonServer(socketserver.ThreadingMixIn,
+                   socketserver.UnixStreamServer):
+    """Runs vcd commands received through the daemon socket.
+
+    Commands run one at a time in this process, with stdin, stdout, stderr,
+    the working directory and the VCD_* environment variables of the
+    calling vcd process. Connections are handled by threads, so that a
+    command received while another one is running is sent back to its vcd
+    process to run there, instead of waiting for its turn.
+    """
+
+    # seconds between two checks of the running and idle state
+    timeout = 0.5
+
+    def __init__(self, path, idle_timeout=None):
+        self.started = time.time()
+        self.last_used = self.started
+        self.commands = 0
+        self.running = True
+        self.idle_timeout = idle_timeout
+        self.command_lock = threading.Lock()
+        socketserver.UnixStreamServer.__init__(self, path,
+                                               DaemonRequestHandler)
+
+    def handle_timeout(self):
+        if self.idle_timeout is not None and \
+                not self.command_lock.locked() and \
+                time.time() - self.last_used > self.idle_timeout:
+            self.running = False
+
+    def serve(self):
+        while self.running:
+            self.handle_request()
+
+    def status(self):
+        return {
+            'pid': os.getpid(),
+            'socket': self.server_address,
+            'uptime': int(time.time() - self.started),
+            'commands': self.commands,
+            'busy': self.command_lock.locked(),
+            'sessions': len(get_session_cache() or {})
+        }
+
+    def run_command(self, sock, request):
+        is_tty = request.get('isatty', [False, False, False])
+        saved_streams = (sys.stdin, sys.stdout, sys.stderr)
+        saved_cwd = os.getcwd()
+        saved_environ = dict(os.environ)
+        stdin = _ForwardedInput(sock, is_tty[0])
+        saved_getpass = click.termui.hidden_prompt_func
+        exit_code = 0
+        try:
+            sys.stdin = _text_stream(stdin, False)
+            sys.stdout = _text_stream(_ForwardedOutput(sock, b'O', is_tty[1]),
+                                      True)
+            sys.stderr = _text_stream(_ForwardedOutput(sock, b'R', is_tty[2]),
+                                      True)
+            click.termui.hidden_prompt_func = stdin.getpass
+            os.chdir(request['cwd'])
+            for k in [k for k in os.environ if k.startswith('VCD_')]:
+                del os.environ[k]
+            os.environ.update(request.get('env', {}))
+            self.commands += 1
+            exit_code = run_command(request['argv'])
+        except (OSError, EOFError):
+            # the calling process went away
+            raise
+        except Exception:
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            for stream in (sys.stdout, sys.stderr):
+                try:
+                    stream.flush()
+                except Exception:
+                    pass
+            sys.stdin, sys.stdout, sys.stderr = saved_streams
+            click.termui.hidden_prompt_func = saved_getpass
+            os.chdir(saved_cwd)
+            os.environ.clear()
+            os.environ.update(saved_environ)
+        return exit_code
+
+
+class DaemonRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        try:
+            frame_type, payload = recv_frame(self.request)
+            request = json.loads(payload.decode('utf-8'))
+            control = request.get('control')
+            if control == 'status':
+                result = json.dumps(self.server.status())
+            elif control == 'stop':
+                self.server.running = False
+                result = json.dumps({'stopped': True})
+            elif get_command_name(request['argv']) in LOCAL_COMMANDS or \
+                    not self.server.command_lock.acquire(blocking=False):
+                send_frame(self.request, b'L')
+                return
+            else:
+                try:
+                    result = str(self.server.run_command(self.request,
+                                                         request))
+                finally:
+                    self.server.last_used = time.time()
+                    self.server.command_lock.release()
+            send_frame(self.request, b'X', result.encode('utf-8'))
+        except (OSError, EOFError):
+            pass
+
+
+def _send_control(control):
+    sock = connect(timeout=5)
+    if sock is None:
+        return None
+    try:
+        send_frame(sock, b'A', json.dumps({'control': control}).encode())
+        frame_type, payload = recv_frame(sock)
+        return json.loads(payload.decode('utf-8'))
+    except (OSError, EOFError, socket.timeout):
+        return None
+    finally:
+        sock.close()
+
+
+def _serve(path, idle_timeout):
+    enable_session_cache()
+    for name in vcd.list_commands(None):
+        vcd.get_command(None, name)
+    old_umask = os.umask(0o077)
+    try:
+        server = DaemonServer(path, idle_timeout=idle_timeout)
+    finally:
+        os.umask(old_umask)
+    try:
+        server.serve()
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.remove(path)
+
+
+@daemon.command(short_help='start the vcd daemon')
+@click.pass_context
+@click.option(
+    '-f',
+    '--foreground',
+    is_flag=True,
+    default=False,
+    help='Run in the foreground instead of detaching from the terminal')
+@click.option(
+    '-t',
+    '--idle-timeout',
+    type=int,
+    default=None,
+    metavar='<seconds>',
+    help='Exit after this many seconds without commands')
+def start(ctx, foreground, idle_timeout):
+    try:
+        if not hasattr(socket, 'AF_UNIX') or not hasattr(os, 'fork'):
+            raise Exception('The vcd daemon is not supported on this '
+                            'platform.')
+        if _send_control('status') is not None:
+            raise Exception('The vcd daemon is already running.')
+        path = get_socket_path()
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        if os.path.exists(path):
+            os.remove(path)
+        if foreground:
+            click.echo('vcd daemon listening on %s' % path)
+            _serve(path, idle_timeout)
+            return
+        pid = os.fork()
+        if pid == 0:
+            os.setsid()
+            devnull = os.open(os.devnull, os.O_RDWR)
+            for fd in range(3):
+                os.dup2(devnull, fd)
+            try:
+                _serve(path, idle_timeout)
+            finally:
+                os._exit(0)
+        for n in range(50):
+            status = _send_control('status')
+            if status is not None:
+                stdout(status, ctx, 'vcd daemon started, pid: %s' %
+                       status['pid'])
+                return
+            time.sleep(0.1)
+        raise Exception('The vcd daemon could not be started.')
+    except Exception as e:
+        stderr(e, ctx)
+
+
+@daemon.command(short_help='stop the vcd daemon')
+@click.pass_context
+def stop(ctx):
+    try:
+        if _send_control('stop') is None:
+            raise Exception('The vcd daemon is not running.')
+        stdout('vcd daemon stopped.', ctx)
+    except Exception as e:
+        stderr(e, ctx)
+
+
+@daemon.command(short_help='show the status of the vcd daemon')
+@click.pass_context
+def status(ctx):
+    try:
+        status = _send_control('status')
+        if status is None:
+            raise Exception('The vcd daemon is not running.')
+        stdout(status, ctx)
+    except Exception as e:
+        stderr(e, ctx)
@@ -0,0 +1,192 @@
+# vCloud CLI 0.1
+#
+# Copyright (c) 2014-2018 VMware, Inc. All Rights Reserved.
+#
+# This product is licensed to you under the
+# Apache License, Version 2.0 (the "License").
+# You may not use this product except in compliance with the License.
+#
+# This product may include a number of subcomponents with
+# separate copyright notices and license terms. Your use of the source
+# code for the these subcomponents is subject to the terms and
+# conditions of the subcomponent's license, as noted in the LICENSE file.
+#
+
+"""Entry point of the vcd command.
+
+When a vcd daemon is running (see 'vcd daemon'), the command line is
+forwarded to it through its UNIX socket and the output of the command is
+relayed back. Otherwise, or when the daemon is running the command of
+another vcd process, the command runs in this process.
+
+This module is imported on every invocation and only depends on the
+standard library, so that forwarding a command is cheap.
+
+Messages exchanged with the daemon are frames made of a one byte type, the
+payload length as a 4 byte unsigned integer and the payload:
+
+    client to daemon
+        A   command request, JSON object
+        I   data read from stdin, empty when stdin is at EOF
+
+    daemon to client
+        O   data written to stdout
+        R   data written to stderr
+        I   request to read from stdin, payload is the maximum size
+        P   request to read a password, payload is the prompt
+        X   end of the command, payload is the exit code
+        L   the command has to run in the calling process, because the
+            daemon is running another command or the command is local
+"""
+
+import getpass
+import json
+import os
+import socket
+import struct
+import sys
+
+DAEMON_SOCKET_PATH = '~/.vcd-cli/daemon.sock'
+
+# Commands that always run in the calling process.
+LOCAL_COMMANDS = ['daemon', 'login']
+
+# Options of vcd that take a value, see vcd_cli.vcd.
+GLOBAL_OPTIONS_WITH_VALUE = [
+    '-o', '--output', '--task-timeout', '--poll-interval'
+]
+
+FRAME_HEADER = struct.Struct('!cI')
+
+
+def send_frame(sock, frame_type, payload=b''):
+    sock.sendall(FRAME_HEADER.pack(frame_type, len(payload)) + payload)
+
+
+def _recv_exactly(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise EOFError('connection closed')
+        data += chunk
+    return data
+
+
+def recv_frame(sock):
+    frame_type, size = FRAME_HEADER.unpack(
+        _recv_exactly(sock, FRAME_HEADER.size))
+    return frame_type, _recv_exactly(sock, size)
+
+
+def get_socket_path():
+    return os.path.expanduser(DAEMON_SOCKET_PATH)
+
+
+def connect(timeout=None):
+    """Connect to the daemon, return None if it is not running."""
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    path = get_socket_path()
+    if not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+    except (OSError, socket.timeout):
+        sock.close()
+        return None
+    return sock
+
+
+def get_command_name(argv):
+    """Get the name of the command of a vcd command line.
+
+    :param list argv: command line arguments, without the program name.
+
+    :rtype: str
+    """
+    args = iter(argv)
+    for arg in args:
+        if arg in GLOBAL_OPTIONS_WITH_VALUE:
+            next(args, None)
+        elif not arg.startswith('-'):
+            return arg
+    return None
+
+
+def _is_tty(stream):
+    try:
+        return stream.isatty()
+    except Exception:
+        return False
+
+
+def forward_command(argv):
+    """Run the command in the daemon.
+
+    :param list argv: command line arguments, without the program name.
+
+    :return: the exit code of the command, None if the daemon is not
+        running or busy, and the command has to run in this process.
+
+    :rtype: int
+    """
+    sock = connect(timeout=1)
+    if sock is None:
+        return None
+    request = {
+        'argv': argv,
+        'cwd': os.getcwd(),
+        'env': {k: v for k, v in os.environ.items() if k.startswith('VCD_')},
+        'isatty': [_is_tty(sys.stdin), _is_tty(sys.stdout),
+                   _is_tty(sys.stderr)]
+    }
+    try:
+        send_frame(sock, b'A', json.dumps(request).encode('utf-8'))
+        sock.settimeout(None)
+        frame_type, payload = recv_frame(sock)
+    except (OSError, EOFError, socket.timeout):
+        sock.close()
+        return None
+    if frame_type == b'L':
+        sock.close()
+        return None
+    try:
+        while frame_type != b'X':
+            if frame_type == b'O':
+                sys.stdout.buffer.write(payload)
+                sys.stdout.buffer.flush()
+            elif frame_type == b'R':
+                sys.stderr.buffer.write(payload)
+                sys.stderr.buffer.flush()
+            elif frame_type == b'I':
+                try:
+                    data = os.read(sys.stdin.fileno(), int(payload))
+                except (OSError, ValueError):
+                    data = b''
+                send_frame(sock, b'I', data)
+            elif frame_type == b'P':
+                try:
+                    data = getpass.getpass(payload.decode('utf-8'))
+                except EOFError:
+                    data = ''
+                send_frame(sock, b'I', data.encode('utf-8'))
+            frame_type, payload = recv_frame(sock)
+        return int(payload)
+    except (OSError, EOFError) as e:
+        sys.stderr.write('Error: lost connection to vcd daemon: %s\n' % e)
+        return 1
+    finally:
+        sock.close()
+
+
+def main():
+    argv = sys.argv[1:]
+    if get_command_name(argv) not in LOCAL_COMMANDS:
+        exit_code = forward_command(argv)
+        if exit_code is not None:
+            sys.exit(exit_code)
+    from vcd_cli.vcd import vcd
+    vcd()
@@ -16,9 +16,12 @@ import click
 from pyvcloud.vcd.client import ApiVersion
 from pyvcloud.vcd.client import EdgeGatewayType
 from pyvcloud.vcd.client import GatewayBackingConfigType
+from pyvcloud.vcd.client import NSMAP
 from pyvcloud.vcd.gateway import Gateway
 from pyvcloud.vcd.vdc import VDC
 
+from vcd_cli.href_cache import invalidate_href
+from vcd_cli.href_cache import resolve_resource
 from vcd_cli.utils import restore_session
 from vcd_cli.utils import stderr
 from vcd_cli.utils import stdout
@@ -337,6 +340,7 @@ def delete_gateway(ctx, name):
         vdc_href = ctx.obj['profiles'].get('vdc_href')
         vdc = VDC(client, href=vdc_href)
         task = vdc.delete_gateway(name)
+        invalidate_href(ctx, 'gateway', name)
         stdout(task, ctx)
     except Exception as e:
         stderr(e, ctx)
@@ -412,9 +416,14 @@ def get_gateway(ctx, name):
     client = ctx.obj['client']
     vdc_href = ctx.obj['profiles'].get('vdc_href')
     vdc = VDC(client, href=vdc_href)
-    gateway = vdc.get_gateway(name)
-    gateway_resource = Gateway(client, href=gateway.get('href'))
-    return gateway_resource
+    gateway = resolve_resource(ctx, 'gateway', name,
+                               lambda: vdc.get_gateway(name))
+    if gateway.tag == '{' + NSMAP['vcloud'] + '}EdgeGateway':
+        # the resource was fetched from the cached href, don't fetch it
+        # again
+        return Gateway(client, resource=gateway)
+    # the query record of the gateway
+    return Gateway(client, href=gateway.get('href'))
 
 
 @gateway.command('info', short_help='show gateway information.')
@@ -586,6 +595,8 @@ def edit_gateway(ctx, name, new_name, desc, is_enabled):
     try:
         gateway_resource = get_gateway(ctx, name)
         task = gateway_resource.edit_gateway(new_name, desc, is_enabled)
+        if new_name is not None:
+            invalidate_href(ctx, 'gateway', name)
         stdout(task, ctx)
     except Exception as e:
         stderr(e, ctx)
@@ -0,0 +1,203 @@
+# vCloud CLI 0.1
+#
+# Copyright (c) 2014-2018 VMware, Inc. All Rights Reserved.
+#
+# This product is licensed to you under the
+# Apache License, Version 2.0 (the "License").
+# You may not use this product except in compliance with the License.
+#
+# This product may include a number of subcomponents with
+# separate copyright notices and license terms. Your use of the source
+# code for the these subcomponents is subject to the terms and
+# conditions of the subcomponent's license, as noted in the LICENSE file.
+#
+
+"""Cache of the hrefs of resources looked up by name.
+
+Commands identify vApps, catalogs, gateways and networks by name, and
+finding the resource with a given name usually takes several requests.
+The href found for a name is kept in ~/.vcd-cli/href-cache.json, keyed by
+host, org and vdc in use, resource type and name, for HREF_CACHE_TTL
+seconds (VCD_HREF_CACHE_TTL overrides it, 0 disables the cache).
+
+A cached href is only used if the resource it points to still exists and
+has the same name, otherwise the entry is dropped and the resource is
+looked up again. Commands that delete, rename or move resources drop the
+affected entries.
+
+The same file keeps the list of query hrefs of each host and user, which
+pyvcloud otherwise fetches before the first query made by a client.
+"""
+
+import json
+import os
+import tempfile
+import time
+
+from pyvcloud.vcd.exceptions import AccessForbiddenException
+from pyvcloud.vcd.exceptions import EntityNotFoundException
+from pyvcloud.vcd.exceptions import NotFoundException
+from pyvcloud.vcd.exceptions import OperationNotSupportedException
+
+from vcd_cli.profiles import VCD_CLI_USER_PATH
+
+HREF_CACHE_PATH = VCD_CLI_USER_PATH + '/href-cache.json'
+HREF_CACHE_TTL = 600
+
+_entries = None
+
+
+def get_href_cache_ttl():
+    try:
+        return int(os.environ.get('VCD_HREF_CACHE_TTL', HREF_CACHE_TTL))
+    except ValueError:
+        return HREF_CACHE_TTL
+
+
+def _get_entries():
+    global _entries
+    if _entries is None:
+        try:
+            with open(os.path.expanduser(HREF_CACHE_PATH), 'r') as f:
+                _entries = json.load(f)
+        except Exception:
+            _entries = {}
+    return _entries
+
+
+def _save_entries():
+    path = os.path.expanduser(HREF_CACHE_PATH)
+    now = time.time()
+    entries = {k: v for k, v in _get_entries().items() if v[1] > now}
+    try:
+        parent_dir = os.path.dirname(path)
+        if not os.path.exists(parent_dir):
+            os.makedirs(parent_dir)
+        fd, tmp_path = tempfile.mkstemp(dir=parent_dir, prefix='.href-cache')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, path)
+    except Exception:
+        pass
+
+
+def _scope(ctx):
+    profiles = ctx.obj['profiles']
+    return '%s|%s|%s|' % (profiles.get('host'), profiles.get('org_in_use'),
+                          profiles.get('vdc_in_use'))
+
+
+def get_cached_href(ctx, resource_type, name):
+    if get_href_cache_ttl() <= 0:
+        return None
+    entry = _get_entries().get(_scope(ctx) + resource_type + '|' + name)
+    if entry is None or entry[1] < time.time():
+        return None
+    return entry[0]
+
+
+def cache_href(ctx, resource_type, name, href):
+    ttl = get_href_cache_ttl()
+    if ttl <= 0 or href is None:
+        return
+    key = _scope(ctx) + resource_type + '|' + name
+    _get_entries()[key] = [href, int(time.time()) + ttl]
+    _save_entries()
+
+
+def invalidate_href(ctx, resource_type, name=None):
+    """Drop cached hrefs.
+
+    :param click.core.Context ctx: click context, the entries are the ones
+        of the org and vdc in use.
+    :param str resource_type: type of the resources, like 'vapp'.
+    :param str name: name of the resource, all the resources of the type
+        when None.
+    """
+    prefix = _scope(ctx) + resource_type + '|'
+    entries = _get_entries()
+    if name is None:
+        keys = [k for k in entries if k.startswith(prefix)]
+    else:
+        keys = [k for k in [prefix + name] if k in entries]
+    if len(keys) > 0:
+        for k in keys:
+            del entries[k]
+        _save_entries()
+
+
+def resolve_resource(ctx, resource_type, name, find):
+    """Get the resource of the given type and name.
+
+    The resource is fetched from its cached href if there is one, otherwise
+    it is looked up with find() and its href is cached.
+
+    :param click.core.Context ctx: click context with a restored session.
+    :param str resource_type: type of the resource, like 'vapp'.
+    :param str name: name of the resource.
+    :param function find: returns the resource, or an object with its
+        href, when it isn't cached.
+
+    :return: the resource, or the result of find().
+
+    :rtype: lxml.objectify.ObjectifiedElement
+    """
+    href = get_cached_href(ctx, resource_type, name)
+    if href is not None:
+        try:
+            resource = ctx.obj['client'].get_resource(href)
+            if resource.get('name') == name:
+                return resource
+        except (AccessForbiddenException, EntityNotFoundException,
+                NotFoundException):
+            pass
+        invalidate_href(ctx, resource_type, name)
+    resource = find()
+    if resource is not None:
+        cache_href(ctx, resource_type, name, resource.get('href'))
+    return resource
+
+
+def _query_list_key(ctx):
+    # the queries of a tenant don't include the admin ones of a sysadmin
+    profiles = ctx.obj['profiles']
+    return 'query-list|%s|%s|%s|%s' % (profiles.get('host'),
+                                       profiles.get('org'),
+                                       profiles.get('user'),
+                                       ctx.obj['client'].get_api_version())
+
+
+def execute_typed_query(ctx, query_type_name, **kwargs):
+    """Run a typed query, using the cached query list of the host and user.
+
+    A query missing from the cached list is looked up in the list fetched
+    from the server, which is cached again.
+
+    :param click.core.Context ctx: click context with a restored session.
+    :param str query_type_name: name of the query, like 'adminVM'.
+    :param kwargs: arguments of pyvcloud's Client.get_typed_query().
+
+    :return: the result of the query's execute().
+    """
+    client = ctx.obj['client']
+    ttl = get_href_cache_ttl()
+    if ttl <= 0:
+        return client.get_typed_query(query_type_name, **kwargs).execute()
+    key = _query_list_key(ctx)
+    entry = _get_entries().get(key)
+    if entry is not None and entry[1] > time.time():
+        if client._query_list_map is None:
+            client._query_list_map = {
+                (t, n): href for t, n, href in entry[0]
+            }
+        try:
+            return client.get_typed_query(query_type_name, **kwargs).execute()
+        except OperationNotSupportedException:
+            client._query_list_map = None
+    result = client.get_typed_query(query_type_name, **kwargs).execute()
+    _get_entries()[key] = [
+        [[t, n, href] for (t, n), href in client._query_list_map.items()],
+        int(time.time()) + ttl
+    ]
+    _save_entries()
+    return result
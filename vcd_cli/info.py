@@ -19,6 +19,7 @@ from pyvcloud.vcd.utils import stdout_xml
 from pyvcloud.vcd.utils import to_camel_case
 from tabulate import tabulate
 
+from vcd_cli.utils import is_colorized
 from vcd_cli.utils import restore_session
 from vcd_cli.utils import stderr
 from vcd_cli.utils import tabulate_names
@@ -79,7 +80,7 @@ def info(ctx, resource_type, resource_id):
         elif len(records) > 1:
             raise Exception('multiple found')
         resource = client.get_resource(records[0].get('href'))
-        stdout_xml(resource, ctx.find_root().params['is_colorized'])
+        stdout_xml(resource, is_colorized(ctx))
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -0,0 +1,263 @@
+# VMware vCloud Director CLI
+#
+# Copyright (c) 2014-2018 VMware, Inc. All Rights Reserved.
+#
+# This product is licensed to you under the
+# Apache License, Version 2.0 (the "License").
+# You may not use this product except in compliance with the License.
+#
+# This product may include a number of subcomponents with
+# separate copyright notices and license terms. Your use of the source
+# code for the these subcomponents is subject to the terms and
+# conditions of the subcomponent's license, as noted in the LICENSE file.
+#
+
+from contextlib import closing
+import datetime
+import itertools
+
+import click
+
+from vcd_cli.inventory_index import execute_sql
+from vcd_cli.inventory_index import get_watermark
+from vcd_cli.inventory_index import INVENTORY_TYPES
+from vcd_cli.inventory_index import open_inventory
+from vcd_cli.inventory_index import query_inventory
+from vcd_cli.inventory_index import refresh_inventory
+from vcd_cli.inventory_index import sync_resource_type
+from vcd_cli.profiles import Profiles
+from vcd_cli.query import parse_fields
+from vcd_cli.utils import as_metavar
+from vcd_cli.utils import restore_session
+from vcd_cli.utils import stderr
+from vcd_cli.utils import stdout
+from vcd_cli.vcd import vcd
+
+
+@vcd.group(short_help='work with the local inventory index')
+@click.pass_context
+def inventory(ctx):
+    """Work with a local index of the inventory of vCloud Director.
+
+\b
+    Description
+        The orgs, vdcs, vApps, VMs, catalogs, catalog items, networks,
+        edge gateways and independent disks visible to the user are
+        fetched with the same typed queries as 'vcd search', and stored in
+        a SQLite database in ~/.vcd-cli/inventory. There is a database per
+        host and login org.
+\b
+        Queries of the inventory are answered from the database without
+        contacting vCloud Director, its records are as recent as the last
+        sync or refresh of their resource type.
+\b
+        A refresh only fetches the resources changed by the tasks and
+        audit events since the previous sync or refresh, it is much
+        cheaper than a sync and can be run often. Changes not made
+        through tasks or events, like the ones of vCenter, need a sync.
+\b
+        Resource types are stored in tables named after them, with a
+        column per attribute of their query records. Records are
+        identified by their href, attributes referring to other resources,
+        like vdc or container, hold their hrefs.
+\b
+    Examples
+        vcd inventory sync
+            Index all the resource types.
+\b
+        vcd inventory sync vm vapp
+            Index the VMs and vApps only.
+\b
+        vcd inventory refresh
+            Fetch the resources that changed since the last sync or
+            refresh.
+\b
+        vcd inventory status
+            Show when each resource type was indexed.
+\b
+        vcd inventory query vm --name web-01
+            Look up VMs by name.
+\b
+        vcd inventory query vm -f 'status==POWERED_ON;memoryMB=gt=4096'
+            Find the powered on VMs with more than 4GB of memory.
+\b
+        vcd inventory query vapp -f 'name==cse-*' --fields name,vdcName
+            Find the vApps whose name starts with 'cse-'.
+\b
+        vcd inventory query --sql "SELECT vm.name, vapp.ownerName
+            FROM vm JOIN vapp ON vm.container = vapp.href"
+            Join the VMs with their vApp.
+    """
+    pass
+
+
+@inventory.command(short_help='index resources')
+@click.pass_context
+@click.argument(
+    'resource_types',
+    metavar=as_metavar(list(INVENTORY_TYPES.keys())),
+    type=click.Choice(list(INVENTORY_TYPES.keys())),
+    nargs=-1,
+    required=False)
+def sync(ctx, resource_types):
+    """Fetch resources and store them in the inventory.
+
+\b
+    Description
+        Replaces the records of the given resource types, or of all of
+        them, with the ones currently in vCloud Director.
+    """
+    try:
+        restore_session(ctx)
+        result = []
+        with closing(open_inventory(ctx.obj['profiles'])) as conn:
+            # changes made while the records are fetched are found by the
+            # next refresh
+            watermark = get_watermark(ctx)
+            for resource_type in resource_types or INVENTORY_TYPES.keys():
+                result.append(sync_resource_type(ctx, conn, resource_type,
+                                                 watermark))
+        stdout(result, ctx)
+    except Exception as e:
+        stderr(e, ctx)
+
+
+@inventory.command(short_help='index the resources that changed')
+@click.pass_context
+def refresh(ctx):
+    """Fetch the resources that changed since the last sync or refresh.
+
+\b
+    Description
+        Finds the resources changed by tasks and audit events since the
+        last sync or refresh of the indexed resource types, and only
+        fetches those, along with the VMs of changed vApps and the items
+        of changed catalogs. Resources that were deleted are removed.
+    """
+    try:
+        restore_session(ctx)
+        with closing(open_inventory(ctx.obj['profiles'])) as conn:
+            result = refresh_inventory(ctx, conn)
+        stdout(result, ctx)
+    except Exception as e:
+        stderr(e, ctx)
+
+
+@inventory.command(short_help='show the state of the inventory')
+@click.pass_context
+def status(ctx):
+    try:
+        profiles = Profiles.load()
+        with closing(open_inventory(profiles, read_only=True)) as conn:
+            result = []
+            for row in execute_sql(
+                    conn, 'SELECT * FROM sync_state ORDER BY resource_type'):
+                row['synced_at'] = datetime.datetime.fromtimestamp(
+                    row['synced_at']).isoformat(' ', 'seconds')
+                result.append(row)
+        if len(result) == 0:
+            stdout('The inventory is empty, run \'vcd inventory sync\'.',
+                   ctx)
+        else:
+            stdout(result, ctx, sort_headers=False)
+    except Exception as e:
+        stderr(e, ctx)
+
+
+@inventory.command(short_help='query the inventory')
+@click.pass_context
+@click.argument(
+    'resource_type',
+    metavar=as_metavar(list(INVENTORY_TYPES.keys())),
+    type=click.Choice(list(INVENTORY_TYPES.keys())),
+    required=False)
+@click.option(
+    '-f',
+    '--filter',
+    'query_filter',
+    required=False,
+    metavar='[query-filter]',
+    help='query filter, like the ones of vcd search')
+@click.option(
+    '--name',
+    required=False,
+    metavar='<name>',
+    help='only show the resources with this name')
+@click.option(
+    '--fields',
+    required=False,
+    default=None,
+    metavar='<attribute,...>',
+    help='only show these attributes')
+@click.option(
+    '--sort-asc',
+    required=False,
+    default=None,
+    metavar='<attribute>',
+    help='sort by this attribute, ascending')
+@click.option(
+    '--sort-desc',
+    required=False,
+    default=None,
+    metavar='<attribute>',
+    help='sort by this attribute, descending')
+@click.option(
+    '-l',
+    '--limit',
+    type=click.IntRange(0),
+    required=False,
+    default=None,
+    metavar='<number>',
+    help='show at most this many resources')
+@click.option(
+    '--count',
+    is_flag=True,
+    default=False,
+    help='only show the number of resources')
+@click.option(
+    '--sql',
+    required=False,
+    default=None,
+    metavar='<query>',
+    help='run this SQL query instead')
+def query(ctx, resource_type, query_filter, name, fields, sort_asc, sort_desc,
+          limit, count, sql):
+    """Query the inventory, without contacting vCloud Director.
+
+\b
+    Description
+        Shows the indexed resources of a type, optionally filtered with
+        the syntax of the filters of 'vcd search', or the result of a SQL
+        query. The database is opened read-only.
+    """
+    try:
+        profiles = Profiles.load()
+        with closing(open_inventory(profiles, read_only=True)) as conn:
+            if sql is not None:
+                rows = execute_sql(conn, sql)
+                sort_headers = False
+            elif resource_type is None:
+                raise Exception('Missing resource type or --sql query.')
+            else:
+                rows = query_inventory(
+                    conn,
+                    resource_type,
+                    qfilter=query_filter,
+                    name=name,
+                    fields=parse_fields(fields),
+                    sort_asc=sort_asc,
+                    sort_desc=sort_desc,
+                    limit=limit,
+                    count=count)
+                sort_headers = True
+                if count:
+                    stdout({'count': rows}, ctx, alt_text=str(rows))
+                    return
+            first = next(rows, None)
+            if first is None:
+                stdout('not found', ctx)
+            else:
+                stdout(itertools.chain([first], rows), ctx, show_id=True,
+                       sort_headers=sort_headers)
+    except Exception as e:
+        stderr(e, ctx)
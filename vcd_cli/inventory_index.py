@@ -0,0 +1,605 @@
+# VMware vCloud Director CLI
+#
+# Copyright (c) 2014-2018 VMware, Inc. All Rights Reserved.
+#
+# This product is licensed to you under the
+# Apache License, Version 2.0 (the "License").
+# You may not use this product except in compliance with the License.
+#
+# This product may include a number of subcomponents with
+# separate copyright notices and license terms. Your use of the source
+# code for the these subcomponents is subject to the terms and
+# conditions of the subcomponent's license, as noted in the LICENSE file.
+#
+
+"""Local SQLite index of the inventory of vCloud Director.
+
+The records of the typed queries of each resource type are stored in a
+table named after the type, with a column per record attribute and the
+href as primary key. Attributes holding numbers are stored as numbers, so
+that they compare as such.
+
+There is a database per host and login org, in ~/.vcd-cli/inventory, as
+the records a user can see depend on the org. The sync_state table tells
+when each resource type was last synchronized.
+
+A synchronization fetches all the records of a resource type. A refresh
+only fetches the records of the resources that changed since the previous
+synchronization or refresh, found in the tasks and audit events started
+after a watermark: the date of the most recent task or event when the
+previous one started. vApps and catalogs are refreshed with their VMs and
+catalog items.
+"""
+
+import collections
+import itertools
+import os
+import re
+import sqlite3
+import time
+import urllib.parse
+
+from pyvcloud.vcd.client import QueryResultFormat
+from pyvcloud.vcd.client import ResourceType
+from pyvcloud.vcd.exceptions import AccessForbiddenException
+from pyvcloud.vcd.exceptions import OperationNotSupportedException
+
+from vcd_cli.profiles import VCD_CLI_USER_PATH
+from vcd_cli.query import chunks
+from vcd_cli.query import join_filters
+from vcd_cli.query import QUERY_PAGE_SIZE
+from vcd_cli.query import query_records
+
+INVENTORY_PATH = VCD_CLI_USER_PATH + '/inventory'
+
+# Resource types of the inventory: query used by the system administrator,
+# query used by other users and filter of the records to keep.
+INVENTORY_TYPES = collections.OrderedDict([
+    ('org', (ResourceType.ORGANIZATION.value,
+             ResourceType.ORGANIZATION.value, None)),
+    ('vdc', (ResourceType.ADMIN_ORG_VDC.value,
+             ResourceType.ORG_VDC.value, None)),
+    ('vapp', (ResourceType.ADMIN_VAPP.value,
+              ResourceType.VAPP.value, None)),
+    ('vm', (ResourceType.ADMIN_VM.value,
+            ResourceType.VM.value, 'isVAppTemplate==false')),
+    ('catalog', (ResourceType.ADMIN_CATALOG.value,
+                 ResourceType.CATALOG.value, None)),
+    ('catalog_item', (ResourceType.ADMIN_CATALOG_ITEM.value,
+                      ResourceType.CATALOG_ITEM.value, None)),
+    ('network', (ResourceType.ORG_VDC_NETWORK.value,
+                 ResourceType.ORG_VDC_NETWORK.value, None)),
+    ('gateway', (ResourceType.EDGE_GATEWAY.value,
+                 ResourceType.EDGE_GATEWAY.value, None)),
+    ('disk', (ResourceType.ADMIN_DISK.value,
+              ResourceType.DISK.value, None)),
+])
+
+# Type of the ids (urn:vcloud:<type>:<uuid>) of each resource type.
+URN_TYPES = {
+    'org': 'org',
+    'vdc': 'vdc',
+    'vapp': 'vapp',
+    'vm': 'vm',
+    'catalog': 'catalog',
+    'catalog_item': 'catalogitem',
+    'network': 'network',
+    'gateway': 'gateway',
+    'disk': 'disk'
+}
+
+# Resource type of the objects of tasks and the entities of events, by
+# their lowercase type.
+OBJECT_TYPES = {
+    'org': 'org',
+    'vdc': 'vdc',
+    'vapp': 'vapp',
+    'vm': 'vm',
+    'catalog': 'catalog',
+    'catalogitem': 'catalog_item',
+    'network': 'network',
+    'orgnetwork': 'network',
+    'orgvdcnetwork': 'network',
+    'edgegateway': 'gateway',
+    'gateway': 'gateway',
+    'disk': 'disk'
+}
+
+# Resource types refreshed with their parent: attribute with the href of
+# the parent, by resource type of the parent.
+CHILD_TYPES = {
+    'vapp': ('vm', 'container'),
+    'catalog': ('catalog_item', 'catalog')
+}
+
+# Columns that are indexed when a table has them, besides the href, they
+# are the ones used to look up records by id or name and to join tables.
+INDEXED_COLUMNS = [
+    'id', 'name', 'org', 'orgName', 'vdc', 'vdcName', 'container',
+    'containerName', 'catalog', 'catalogName'
+]
+
+_UUID = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-'
+                   r'[0-9a-f]{12}$', re.IGNORECASE)
+_COLUMN_NAME = re.compile(r'^[A-Za-z_][\w]*$')
+_COMPARISON = re.compile(r'^([A-Za-z_]\w*)(==|!=|=lt=|=le=|=gt=|=ge=)(.*)$')
+_OPERATORS = {
+    '==': '=',
+    '!=': '!=',
+    '=lt=': '<',
+    '=le=': '<=',
+    '=gt=': '>',
+    '=ge=': '>='
+}
+
+
+def get_inventory_path(profiles):
+    """Get the path of the inventory database of the host and org in use.
+
+    :param vcd_cli.profiles.Profiles profiles: profiles of the user.
+
+    :rtype: str
+    """
+    host = profiles.get('host')
+    org = profiles.get('org')
+    if not host or not org:
+        raise Exception('Not logged in, login to get an inventory.')
+    file_name = '%s@%s.db' % (org.lower(), host.lower())
+    return os.path.join(os.path.expanduser(INVENTORY_PATH),
+                        re.sub(r'[^\w.@-]', '_', file_name))
+
+
+def open_inventory(profiles, read_only=False):
+    """Open the inventory database of the host and org in use.
+
+    :param vcd_cli.profiles.Profiles profiles: profiles of the user.
+    :param bool read_only: open it for queries only, it must exist then.
+
+    :rtype: sqlite3.Connection
+    """
+    path = get_inventory_path(profiles)
+    if read_only:
+        if not os.path.exists(path):
+            raise Exception('There is no inventory of %s, run \'vcd '
+                            'inventory sync\' first.' % profiles.get('host'))
+        conn = sqlite3.connect('file:%s?mode=ro' % urllib.parse.quote(path),
+                               uri=True)
+        conn.row_factory = sqlite3.Row
+    else:
+        parent_dir = os.path.dirname(path)
+        if not os.path.exists(parent_dir):
+            os.makedirs(parent_dir)
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        # queries keep reading the previous records during a sync
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS sync_state ('
+                     'resource_type TEXT PRIMARY KEY, query_type TEXT, '
+                     'synced_at REAL, records INTEGER, duration REAL, '
+                     'watermark TEXT)')
+        if 'watermark' not in get_columns(conn, 'sync_state'):
+            conn.execute('ALTER TABLE sync_state ADD COLUMN watermark TEXT')
+    return conn
+
+
+def _quote(name):
+    return '"%s"' % name
+
+
+def _value(value):
+    """Get the value of an attribute as stored in the database."""
+    if value is None:
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        try:
+            number = float(value)
+        except ValueError:
+            return value
+    # numbers are only converted if nothing is lost, like leading zeros
+    return number if str(number) == value else value
+
+
+def get_columns(conn, table):
+    """Get the columns of a table, empty if it doesn't exist.
+
+    :rtype: list
+    """
+    return [
+        r['name']
+        for r in conn.execute('PRAGMA table_info(%s)' % _quote(table))
+    ]
+
+
+def _insert_records(conn, table, records):
+    """Insert or replace the records of a typed query in a table.
+
+    Records are inserted by batches, columns are added to the table when
+    records have new attributes.
+
+    :return: the number of records.
+
+    :rtype: int
+    """
+    columns = set(get_columns(conn, table))
+    if len(columns) == 0:
+        conn.execute('CREATE TABLE %s (href TEXT PRIMARY KEY)' %
+                     _quote(table))
+        columns.add('href')
+    count = 0
+    records = iter(records)
+    while True:
+        batch = list(itertools.islice(records, QUERY_PAGE_SIZE))
+        if len(batch) == 0:
+            return count
+        rows = collections.defaultdict(list)
+        for record in batch:
+            attributes = [(k, v) for k, v in record.attrib.items()
+                          if k != 'type' and _COLUMN_NAME.match(k)]
+            for k, v in attributes:
+                if k not in columns:
+                    conn.execute('ALTER TABLE %s ADD COLUMN %s' %
+                                 (_quote(table), _quote(k)))
+                    columns.add(k)
+            keys = tuple(k for k, v in attributes)
+            rows[keys].append([_value(v) for k, v in attributes])
+        for keys, values in rows.items():
+            conn.executemany(
+                'INSERT OR REPLACE INTO %s (%s) VALUES (%s)' %
+                (_quote(table), ', '.join(_quote(k) for k in keys),
+                 ', '.join('?' * len(keys))), values)
+        count += len(batch)
+
+
+def _create_indexes(conn, table):
+    for column in get_columns(conn, table):
+        if column in INDEXED_COLUMNS:
+            conn.execute('CREATE INDEX IF NOT EXISTS %s ON %s (%s)' %
+                         (_quote('%s_%s' % (table, column)), _quote(table),
+                          _quote(column)))
+
+
+def _get_query_type(ctx, resource_type):
+    admin_query, query, qfilter = INVENTORY_TYPES[resource_type]
+    if ctx.obj['client'].is_sysadmin():
+        return admin_query, qfilter
+    return query, qfilter
+
+
+def _get_history_queries(ctx):
+    """Get the task and event queries, with their date attribute."""
+    if ctx.obj['client'].is_sysadmin():
+        return [(ResourceType.ADMIN_TASK.value, 'startDate', 'endDate'),
+                (ResourceType.ADMIN_EVENT.value, 'timeStamp', None)]
+    return [(ResourceType.TASK.value, 'startDate', 'endDate'),
+            (ResourceType.EVENT.value, 'timeStamp', None)]
+
+
+def get_watermark(ctx):
+    """Get the date of the most recent task or audit event.
+
+    :param click.core.Context ctx: click context with a restored session.
+
+    :return: the date, as returned by vCloud Director, None if there are
+        no tasks or events.
+
+    :rtype: str
+    """
+    watermark = None
+    for query_type, date, end_date in _get_history_queries(ctx):
+        try:
+            records = list(query_records(
+                ctx, query_type, sort_desc=date, fields=[date], limit=1))
+        except (AccessForbiddenException, OperationNotSupportedException):
+            # events can't be queried by all users
+            continue
+        if len(records) > 0 and records[0].get(date) is not None:
+            watermark = max(watermark or '', records[0].get(date))
+    return watermark
+
+
+def sync_resource_type(ctx, conn, resource_type, watermark=None):
+    """Replace the records of a resource type with the current ones.
+
+    The records are fetched with the typed query of the resource type and
+    stored as they are received. The previous records stay visible to other
+    connections until all the records are stored.
+
+    :param click.core.Context ctx: click context with a restored session.
+    :param sqlite3.Connection conn: the inventory database.
+    :param str resource_type: resource type of the inventory, like 'vm'.
+    :param str watermark: date of the most recent task or event before the
+        records were fetched, see get_watermark().
+
+    :return: the resource type, the number of records and the duration of
+        the synchronization in seconds.
+
+    :rtype: dict
+    """
+    query_type, qfilter = _get_query_type(ctx, resource_type)
+    start = time.time()
+    records = query_records(
+        ctx,
+        query_type,
+        qfilter=qfilter,
+        query_result_format=QueryResultFormat.ID_RECORDS)
+    with conn:
+        if len(get_columns(conn, resource_type)) > 0:
+            conn.execute('DELETE FROM %s' % _quote(resource_type))
+        count = _insert_records(conn, resource_type, records)
+        _create_indexes(conn, resource_type)
+        duration = round(time.time() - start, 3)
+        conn.execute(
+            'INSERT OR REPLACE INTO sync_state (resource_type, query_type, '
+            'synced_at, records, duration, watermark) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (resource_type, query_type, start, count, duration, watermark))
+    return {
+        'resource_type': resource_type,
+        'records': count,
+        'duration': duration
+    }
+
+
+def _changed_resources(ctx, resource_types, since):
+    """Find the resources changed by the tasks and events after a date.
+
+    Tasks are the ones started or ended at or after the date, so that
+    tasks that were running at that date are included.
+
+    :return: the ids of the changed resources, by resource type, and the
+        date of the most recent task or event.
+
+    :rtype: tuple
+    """
+    changed = collections.defaultdict(set)
+    watermark = since
+    for query_type, date, end_date in _get_history_queries(ctx):
+        if since is None:
+            qfilter = None
+        else:
+            qfilter = '%s=ge=%s' % (date, urllib.parse.quote(since))
+            if end_date is not None:
+                qfilter += ',%s=ge=%s' % (end_date,
+                                          urllib.parse.quote(since))
+        if date == 'startDate':
+            fields = ['object', 'objectType', date, end_date]
+        else:
+            fields = ['entity', 'entityType', date]
+        try:
+            records = query_records(ctx, query_type, qfilter=qfilter,
+                                    fields=fields)
+            for record in records:
+                uuid = _UUID.search(
+                    record.get('object', record.get('entity', '')))
+                object_type = record.get('objectType',
+                                         record.get('entityType'))
+                resource_type = OBJECT_TYPES.get((object_type or '').lower())
+                if uuid is not None and resource_type in resource_types:
+                    changed[resource_type].add(uuid.group(0).lower())
+                for d in (record.get(date), record.get(end_date or '')):
+                    if d is not None:
+                        watermark = max(watermark or '', d)
+        except (AccessForbiddenException, OperationNotSupportedException):
+            continue
+    return changed, watermark
+
+
+def _replace_records(ctx, conn, resource_type, attribute, values):
+    """Replace the records whose attribute has one of the given values.
+
+    Records that are not returned by the query anymore are removed.
+
+    :return: the hrefs of the records before and after, and the number of
+        records fetched.
+
+    :rtype: tuple
+    """
+    query_type, qfilter = _get_query_type(ctx, resource_type)
+    columns = get_columns(conn, resource_type)
+    if attribute == 'id':
+        # ids are stored as urns but the filter takes their uuid
+        urn = 'urn:vcloud:%s:%%s' % URN_TYPES[resource_type]
+        stored_values = [urn % v for v in values]
+    else:
+        stored_values = list(values)
+    hrefs = set()
+    if attribute in columns:
+        condition = '%s IN (%s)' % (_quote(attribute),
+                                    ', '.join('?' * len(stored_values)))
+        table = _quote(resource_type)
+        hrefs.update(r['href'] for r in conn.execute(
+            'SELECT href FROM %s WHERE %s AND href IS NOT NULL' %
+            (table, condition), stored_values))
+        conn.execute('DELETE FROM %s WHERE %s' % (table, condition),
+                     stored_values)
+    value_filter = ','.join('%s==%s' % (attribute, urllib.parse.quote(v))
+                            for v in values)
+    records = list(query_records(
+        ctx,
+        query_type,
+        qfilter=join_filters(value_filter, qfilter),
+        query_result_format=QueryResultFormat.ID_RECORDS))
+    count = _insert_records(conn, resource_type, records)
+    hrefs.update(r.get('href') for r in records if r.get('href'))
+    return hrefs, count
+
+
+def refresh_inventory(ctx, conn):
+    """Refresh the records of the resources that changed.
+
+    The resources changed by the tasks and audit events since the lowest
+    watermark of the synchronized resource types are fetched again, along
+    with the children of vApps and catalogs. Resources that don't exist
+    anymore are removed.
+
+    :param click.core.Context ctx: click context with a restored session.
+    :param sqlite3.Connection conn: the inventory database.
+
+    :return: the resource type, the number of changed resources, the
+        number of records fetched and the duration of the refresh in
+        seconds, for each synchronized resource type.
+
+    :rtype: list
+    """
+    state = {
+        r['resource_type']: r['watermark']
+        for r in conn.execute('SELECT resource_type, watermark '
+                              'FROM sync_state')
+    }
+    if len(state) == 0:
+        raise Exception('The inventory is empty, run \'vcd inventory sync\''
+                        ' first.')
+    watermarks = [w for w in state.values() if w is not None]
+    if len(watermarks) < len(state):
+        since = None
+    else:
+        since = min(watermarks)
+    changed, watermark = _changed_resources(ctx, state.keys(), since)
+    result = []
+    with conn:
+        parents = {}
+        for resource_type in INVENTORY_TYPES.keys():
+            if resource_type not in state:
+                continue
+            type_start = time.time()
+            count = 0
+            for ids in chunks(changed[resource_type]):
+                hrefs, n = _replace_records(ctx, conn, resource_type, 'id',
+                                            ids)
+                parents.setdefault(resource_type, set()).update(hrefs)
+                count += n
+            for parent_type, (child_type, attribute) in CHILD_TYPES.items():
+                if child_type != resource_type:
+                    continue
+                for hrefs in chunks(parents.get(parent_type, set())):
+                    count += _replace_records(ctx, conn, resource_type,
+                                              attribute, hrefs)[1]
+            _create_indexes(conn, resource_type)
+            conn.execute(
+                'UPDATE sync_state SET watermark = ? WHERE resource_type = ?',
+                (watermark, resource_type))
+            result.append({
+                'resource_type': resource_type,
+                'changed': len(changed[resource_type]),
+                'records': count,
+                'duration': round(time.time() - type_start, 3)
+            })
+    return result
+
+
+def filter_to_sql(qfilter, columns):
+    """Translate a query filter to a SQL condition.
+
+    Filters have the syntax of the filters of typed queries: comparisons
+    of an attribute and a value with ==, !=, =lt=, =le=, =gt= or =ge=,
+    joined with ';' (and) or ',' (or), ';' taking precedence. A '*' in the
+    value of == and != matches any characters. Parentheses are not
+    supported.
+
+    :param str qfilter: the filter, values may be url-encoded.
+    :param list columns: columns of the table.
+
+    :return: the condition and the values of its parameters.
+
+    :rtype: tuple
+    """
+    disjunction = []
+    params = []
+    for terms in qfilter.split(','):
+        conjunction = []
+        for term in terms.split(';'):
+            match = _COMPARISON.match(term.strip())
+            if match is None:
+                raise Exception('Invalid filter: \'%s\'' % term)
+            column, operator, value = match.groups()
+            if column not in columns:
+                raise Exception('Unknown attribute: \'%s\'' % column)
+            value = urllib.parse.unquote(value)
+            if operator in ('==', '!=') and '*' in value:
+                value = re.sub(r'([\\%_])', r'\\\1', value).replace('*', '%')
+                conjunction.append('%s %sLIKE ? ESCAPE \'\\\'' % (
+                    _quote(column), 'NOT ' if operator == '!=' else ''))
+                params.append(value)
+            else:
+                conjunction.append('%s %s ?' % (_quote(column),
+                                                _OPERATORS[operator]))
+                params.append(_value(value))
+        disjunction.append('(%s)' % ' AND '.join(conjunction))
+    return ' OR '.join(disjunction), params
+
+
+def query_inventory(conn,
+                    resource_type,
+                    qfilter=None,
+                    name=None,
+                    fields=None,
+                    sort_asc=None,
+                    sort_desc=None,
+                    limit=None,
+                    count=False):
+    """Get the records of a resource type from the inventory.
+
+    :param sqlite3.Connection conn: the inventory database.
+    :param str resource_type: resource type of the inventory, like 'vm'.
+    :param str qfilter: query filter, see filter_to_sql().
+    :param str name: only get the records with this name.
+    :param list fields: attributes to return, all of them when None.
+    :param str sort_asc: attribute to sort the records by, ascending.
+    :param str sort_desc: attribute to sort the records by, descending.
+    :param int limit: maximum number of records, all of them when None.
+    :param bool count: only get the number of records.
+
+    :return: the records as dictionaries, or their number when count is
+        True.
+
+    :rtype: generator of dict or int
+    """
+    columns = get_columns(conn, resource_type)
+    if len(columns) == 0:
+        raise Exception('There are no %s records in the inventory, run '
+                        '\'vcd inventory sync %s\' first.' %
+                        (resource_type, resource_type))
+    for field in (fields or []) + [sort_asc, sort_desc]:
+        if field is not None and field not in columns:
+            raise Exception('Unknown attribute: \'%s\'' % field)
+    conditions = []
+    params = []
+    if qfilter is not None:
+        condition, condition_params = filter_to_sql(qfilter, columns)
+        # the OR of the filter must not take in the other conditions
+        conditions.append('(%s)' % condition)
+        params.extend(condition_params)
+    if name is not None:
+        conditions.append('name = ?')
+        params.append(name)
+    if count:
+        sql = 'SELECT COUNT(*) FROM %s' % _quote(resource_type)
+    else:
+        sql = 'SELECT %s FROM %s' % (
+            ', '.join(_quote(f) for f in fields) if fields else '*',
+            _quote(resource_type))
+    if len(conditions) > 0:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    if count:
+        return conn.execute(sql, params).fetchone()[0]
+    if sort_asc is not None:
+        sql += ' ORDER BY %s ASC' % _quote(sort_asc)
+    elif sort_desc is not None:
+        sql += ' ORDER BY %s DESC' % _quote(sort_desc)
+    if limit is not None:
+        sql += ' LIMIT %d' % limit
+    return execute_sql(conn, sql, params)
+
+
+def execute_sql(conn, sql, params=()):
+    """Run a SQL query on the inventory.
+
+    :return: the rows, as dictionaries without the NULL values.
+
+    :rtype: generator of dict
+    """
+    for row in conn.execute(sql, params):
+        yield collections.OrderedDict(
+            (k, row[k]) for k in row.keys() if row[k] is not None)
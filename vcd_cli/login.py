@@ -25,6 +25,7 @@ from vcd_cli import browsercookie
 from vcd_cli.profiles import Profiles
 from vcd_cli.utils import as_metavar
 from vcd_cli.utils import restore_session
+from vcd_cli.utils import save_session_validation
 from vcd_cli.utils import stderr
 from vcd_cli.utils import stdout
 from vcd_cli.vcd import vcd
@@ -193,23 +194,25 @@ def login(ctx, user, host, password, api_version, org, verify_ssl_certs,
             token = client.get_xvcloud_authorization_token()
             is_jwt_token = False
 
-        profiles.update(
-            host,
-            org,
-            user,
-            token,
-            negotiated_api_version,
-            verify_ssl_certs,
-            disable_warnings,
-            vdc=in_use_vdc,
-            org_href=org_href,
-            vdc_href=vdc_href,
-            log_request=True,
-            log_header=True,
-            log_body=True,
-            vapp='',
-            vapp_href='',
-            is_jwt_token=is_jwt_token)
+        with profiles.transaction():
+            profiles.update(
+                host,
+                org,
+                user,
+                token,
+                negotiated_api_version,
+                verify_ssl_certs,
+                disable_warnings,
+                vdc=in_use_vdc,
+                org_href=org_href,
+                vdc_href=vdc_href,
+                log_request=True,
+                log_header=True,
+                log_body=True,
+                vapp='',
+                vapp_href='',
+                is_jwt_token=is_jwt_token)
+            save_session_validation(profiles, client)
 
         alt_text = f"{user} logged in, org: '{org}', vdc: '{in_use_vdc}'"
         d = {
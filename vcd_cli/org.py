@@ -122,12 +122,14 @@ def use(ctx, name):
             in_use_vdc = link.name
             vdc_href = link.href
             break
-        ctx.obj['profiles'].set('org_in_use', str(name))
-        ctx.obj['profiles'].set('org_href', str(org_resource.get('href')))
-        ctx.obj['profiles'].set('vdc_in_use', str(in_use_vdc))
-        ctx.obj['profiles'].set('vdc_href', str(vdc_href))
-        ctx.obj['profiles'].set('vapp_in_use', str(in_use_vapp))
-        ctx.obj['profiles'].set('vapp_href', vapp_href)
+        profiles = ctx.obj['profiles']
+        with profiles.transaction():
+            profiles.set('org_in_use', str(name))
+            profiles.set('org_href', str(org_resource.get('href')))
+            profiles.set('vdc_in_use', str(in_use_vdc))
+            profiles.set('vdc_href', str(vdc_href))
+            profiles.set('vapp_in_use', str(in_use_vapp))
+            profiles.set('vapp_href', vapp_href)
         message = 'now using org: \'%s\', vdc: \'%s\', vApp: \'%s\'.' \
             % (name, in_use_vdc, in_use_vapp)
         stdout({
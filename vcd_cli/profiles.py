@@ -12,31 +12,65 @@
 # conditions of the subcomponent's license, as noted in the LICENSE file.
 #
 
+from contextlib import contextmanager
+import copy
 import logging
 import os
+import tempfile
 
 import yaml
 
+try:
+    from yaml import CDumper as Dumper
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import Dumper
+    from yaml import SafeLoader
+
 LOGGER = logging.getLogger(__name__)
 LOGGER.addHandler(logging.FileHandler('vcd.log'))
 
 VCD_CLI_USER_PATH = '~/.vcd-cli'
 PROFILE_PATH = VCD_CLI_USER_PATH + '/profiles.yaml'
 
+# Profiles loaded in this process, by path: (file stamp, Profiles)
+_loaded_profiles = {}
+
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
 
 class Profiles(object):
     def __init__(self):
         self.path = None
         self.data = None
+        self._transaction_level = 0
+        self._modified = False
 
     @staticmethod
     def load(path=PROFILE_PATH):
+        """Load the profiles file.
+
+        The file is parsed once per process, the same Profiles object is
+        returned until the file is modified.
+        """
+        profile_path = os.path.expanduser(path)
+        stamp = _file_stamp(profile_path)
+        if stamp is not None and profile_path in _loaded_profiles:
+            loaded_stamp, p = _loaded_profiles[profile_path]
+            if loaded_stamp == stamp:
+                return p
         try:
-            profile_path = os.path.expanduser(path)
             p = Profiles()
             p.data = {'active': None}
             with open(profile_path, 'r') as f:
-                p.data = yaml.safe_load(f)
+                p.data = yaml.load(f, Loader=SafeLoader)
+            _loaded_profiles[profile_path] = (stamp, p)
         except Exception:
             LOGGER.warning(
                 'Warning: the profiles file \'%s\''
@@ -45,16 +79,65 @@ class Profiles(object):
         return p
 
     def save(self):
+        """Write the profiles file.
+
+        The content is written to a temporary file which then replaces the
+        profiles file, so concurrent readers never see a partial file.
+        """
         try:
             parent_dir = os.path.dirname(self.path)
             if not os.path.exists(parent_dir):
                 os.makedirs(parent_dir)
-            stream = open(self.path, 'w')
-            yaml.dump(self.data, stream, default_flow_style=False)
+            fd, tmp_path = tempfile.mkstemp(dir=parent_dir, prefix='.profiles')
+            try:
+                with os.fdopen(fd, 'w') as stream:
+                    yaml.dump(self.data, stream, Dumper=Dumper,
+                              default_flow_style=False)
+                os.replace(tmp_path, self.path)
+            except Exception:
+                os.remove(tmp_path)
+                raise
+            self._modified = False
+            _loaded_profiles[self.path] = (_file_stamp(self.path), self)
         except Exception:
             import traceback
             traceback.print_exc()
 
+    @contextmanager
+    def transaction(self):
+        """Group updates to the profiles in a single write.
+
+        Changes made with set() and update() inside the with block are
+        saved once, when the block exits. If the block raises an exception
+        the changes are discarded. Transactions can be nested, only the
+        outermost one writes the file.
+
+        Example:
+            with profiles.transaction():
+                profiles.set('vdc_in_use', vdc_name)
+                profiles.set('vdc_href', vdc_href)
+        """
+        if self._transaction_level == 0:
+            saved_data = copy.deepcopy(self.data)
+        self._transaction_level += 1
+        try:
+            yield self
+        except BaseException:
+            self._transaction_level -= 1
+            if self._transaction_level == 0:
+                self.data = saved_data
+                self._modified = False
+            raise
+        self._transaction_level -= 1
+        if self._transaction_level == 0 and self._modified:
+            self.save()
+
+    def _changed(self):
+        if self._transaction_level > 0:
+            self._modified = True
+        else:
+            self.save()
+
     def update(self,
                host,
                org,
@@ -105,7 +188,7 @@ class Profiles(object):
 
         self.data['profiles'] = tmp
         self.data['active'] = str(name)
-        self.save()
+        self._changed()
 
     def get(self, prop, name='default', default=None):
         value = None
@@ -124,5 +207,5 @@ class Profiles(object):
         for p in self.data['profiles']:
             if p['name'] == name:
                 p[prop] = value
-                self.save()
+                self._changed()
                 break
@@ -0,0 +1,297 @@
+# VMware vCloud Director CLI
+#
+# Copyright (c) 2014-2018 VMware, Inc. All Rights Reserved.
+#
+# This product is licensed to you under the
+# Apache License, Version 2.0 (the "License").
+# You may not use this product except in compliance with the License.
+#
+# This product may include a number of subcomponents with
+# separate copyright notices and license terms. Your use of the source
+# code for the these subcomponents is subject to the terms and
+# conditions of the subcomponent's license, as noted in the LICENSE file.
+#
+
+"""Typed queries whose records are consumed as they arrive."""
+
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import os
+
+from pyvcloud.vcd.client import QueryResultFormat
+
+from vcd_cli.href_cache import execute_typed_query
+
+# Records per page requested by list commands, vCD caps it at 128 by
+# default (restapi.queryservice.maxPageSize).
+QUERY_PAGE_SIZE = 128
+
+# Values OR-ed together in a query filter, like 'id==a,id==b', so that the
+# URL of the query stays well below the length limits of servers and
+# proxies.
+FILTER_CHUNK_SIZE = 25
+
+# Pages of a query fetched at the same time, VCD_QUERY_CONCURRENCY
+# overrides it and 1 fetches one page after the other.
+QUERY_CONCURRENCY = 8
+
+
+def get_query_concurrency():
+    try:
+        return max(1, int(os.environ.get('VCD_QUERY_CONCURRENCY',
+                                         QUERY_CONCURRENCY)))
+    except ValueError:
+        return QUERY_CONCURRENCY
+
+
+def parse_fields(fields):
+    """Get the attribute names of a --fields option, None if not given.
+
+    :param str fields: comma separated attribute names.
+
+    :rtype: list
+    """
+    if fields is None:
+        return None
+    return [f.strip() for f in fields.split(',') if f.strip()] or None
+
+
+def chunks(values, size=FILTER_CHUNK_SIZE):
+    """Split values in sorted lists of at most size values.
+
+    :param iterable values: the values, like the ids OR-ed in a filter.
+
+    :rtype: generator of list
+    """
+    values = sorted(values)
+    for n in range(0, len(values), size):
+        yield values[n:n + size]
+
+
+def join_filters(*filters):
+    """Join query filters with a logical AND, skipping the empty ones.
+
+    ';' binds tighter than ',', so each filter is put in parentheses when
+    there are several, like '(status==A,status==B);(ownerName==b)'.
+    """
+    filters = [f for f in filters if f]
+    if len(filters) <= 1:
+        return filters[0] if filters else None
+    return ';'.join('(%s)' % f for f in filters)
+
+
+def _fetch_pages(ctx, query_type_name, limit, page_size, concurrency,
+                 **kwargs):
+    """Get the records of a query, fetching several pages at a time.
+
+    The first page tells the number of records, and so the number of pages.
+    The following pages are then requested by up to concurrency threads,
+    and their records are returned in page order. At most concurrency pages
+    are requested ahead of the records being consumed.
+
+    vCD returns at most its maximum page size per page, whatever the page
+    size requested, so the pages are numbered by the size of the first one
+    when it is smaller than requested.
+    """
+    first_page = execute_typed_query(
+        ctx, query_type_name, page=1, page_size=page_size, **kwargs)
+    total = first_page['resultTotal']
+    if limit is not None:
+        total = min(total, limit)
+    if 0 < len(first_page['values']) < min(page_size, total):
+        page_size = len(first_page['values'])
+    page_count = (total + page_size - 1) // page_size
+    for record in first_page['values']:
+        yield record
+    if page_count <= 1:
+        return
+    client = ctx.obj['client']
+
+    def fetch_page(page):
+        return client.get_typed_query(
+            query_type_name, page=page, page_size=page_size,
+            **kwargs).execute()['values']
+
+    executor = ThreadPoolExecutor(
+        max_workers=min(concurrency, page_count - 1))
+    futures = collections.deque()
+    next_page = 2
+    try:
+        while next_page <= page_count and len(futures) < concurrency:
+            futures.append(executor.submit(fetch_page, next_page))
+            next_page += 1
+        while len(futures) > 0:
+            records = futures.popleft().result()
+            if next_page <= page_count:
+                futures.append(executor.submit(fetch_page, next_page))
+                next_page += 1
+            for record in records:
+                yield record
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def query_records(ctx,
+                  query_type_name,
+                  qfilter=None,
+                  sort_asc=None,
+                  sort_desc=None,
+                  fields=None,
+                  limit=None,
+                  page_size=QUERY_PAGE_SIZE,
+                  page=None,
+                  equality_filter=None,
+                  concurrency=None,
+                  query_result_format=QueryResultFormat.RECORDS):
+    """Get the records of a typed query.
+
+    Records are returned while the query runs, pages are only requested a
+    few at a time as the records of the previous ones are consumed, see
+    _fetch_pages(). Memory use is bound by the page size and concurrency,
+    not by the number of records.
+
+    :param click.core.Context ctx: click context with a restored session.
+    :param str query_type_name: name of the query, like 'adminVM'.
+    :param str qfilter: query filter, values must be url-encoded.
+    :param str sort_asc: attribute to sort the records by, ascending.
+    :param str sort_desc: attribute to sort the records by, descending.
+    :param list fields: attributes to return, all of them when None. The
+        href, and the id of ID_RECORDS, are always returned.
+    :param int limit: maximum number of records, all of them when None.
+    :param int page_size: number of records per page.
+    :param int page: only get the records of this page, starting at 1.
+    :param tuple equality_filter: attribute name and value of a filter
+        AND-ed to qfilter, the value doesn't need to be url-encoded.
+    :param int concurrency: maximum number of pages fetched at the same
+        time, get_query_concurrency() when None.
+    :param QueryResultFormat query_result_format: format of the records.
+
+    :return: the records of the query.
+
+    :rtype: generator of lxml.objectify.ObjectifiedElement
+    """
+    if limit is not None:
+        if limit <= 0:
+            return iter([])
+        if page is None:
+            page_size = min(page_size, limit)
+    if concurrency is None:
+        concurrency = get_query_concurrency()
+    if fields is not None:
+        fields = ','.join(f for f in fields if f not in ('id', 'href'))
+    kwargs = {
+        'query_result_format': query_result_format,
+        'qfilter': qfilter,
+        'equality_filter': equality_filter,
+        'sort_asc': sort_asc,
+        'sort_desc': sort_desc,
+        'fields': fields or None
+    }
+    if page is not None:
+        records = iter(
+            execute_typed_query(ctx, query_type_name, page=page,
+                                page_size=page_size, **kwargs)['values'])
+    elif concurrency > 1:
+        records = _fetch_pages(ctx, query_type_name, limit, page_size,
+                               concurrency, **kwargs)
+    else:
+        records = execute_typed_query(ctx, query_type_name,
+                                      page_size=page_size, **kwargs)
+    if limit is not None:
+        records = itertools.islice(records, limit)
+    return records
+
+
+def count_records(ctx,
+                  query_type_name,
+                  qfilter=None,
+                  equality_filter=None,
+                  query_result_format=QueryResultFormat.RECORDS):
+    """Get the number of records of a typed query.
+
+    Only a page of one record is requested, the number of records is read
+    from its total attribute.
+
+    :param click.core.Context ctx: click context with a restored session.
+    :param str query_type_name: name of the query, like 'adminVM'.
+    :param str qfilter: query filter, values must be url-encoded.
+    :param tuple equality_filter: attribute name and value of a filter
+        AND-ed to qfilter, the value doesn't need to be url-encoded.
+    :param QueryResultFormat query_result_format: format of the records.
+
+    :rtype: int
+    """
+    result = execute_typed_query(
+        ctx,
+        query_type_name,
+        query_result_format=query_result_format,
+        page=1,
+        page_size=1,
+        qfilter=qfilter,
+        equality_filter=equality_filter)
+    return result['resultTotal']
+
+
+def _number(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+
+def aggregate_records(records, group_by=None, sum_fields=None,
+                      avg_fields=None):
+    """Count, sum and average record attributes by group.
+
+    Records are folded into their group as they come, memory only depends
+    on the number of groups. Values that are not numbers are left out of
+    sums and averages.
+
+    :param iterator records: query records.
+    :param list group_by: attributes whose values make the groups, all the
+        records are in one group when None.
+    :param list sum_fields: attributes to add up in each group.
+    :param list avg_fields: attributes to average in each group.
+
+    :return: a dictionary per group, sorted by group, with the group_by
+        attributes, 'count', '<attribute>_sum' and '<attribute>_avg'.
+
+    :rtype: list
+    """
+    group_by = group_by or []
+    sum_fields = sum_fields or []
+    avg_fields = avg_fields or []
+    fields = list(collections.OrderedDict.fromkeys(sum_fields + avg_fields))
+    groups = {}
+    for record in records:
+        key = tuple(record.get(k) or '' for k in group_by)
+        group = groups.get(key)
+        if group is None:
+            # count of records, then sum and count of values of each field
+            group = groups[key] = [0] + [0, 0] * len(fields)
+        group[0] += 1
+        for n, field in enumerate(fields):
+            value = _number(record.get(field))
+            if value is not None:
+                group[1 + 2 * n] += value
+                group[2 + 2 * n] += 1
+    result = []
+    for key in sorted(groups):
+        group = groups[key]
+        row = dict(zip(group_by, key))
+        row['count'] = group[0]
+        for n, field in enumerate(fields):
+            total, values = group[1 + 2 * n], group[2 + 2 * n]
+            if field in sum_fields:
+                row['%s_sum' % field] = total
+            if field in avg_fields:
+                row['%s_avg' % field] = \
+                    round(total / values, 2) if values > 0 else None
+        result.append(row)
+    return result
@@ -21,6 +21,8 @@ from pyvcloud.vcd.exceptions import InvalidParameterException
 from pyvcloud.vcd.vdc import VDC
 from pyvcloud.vcd.vdc_network import VdcNetwork
 
+from vcd_cli.href_cache import invalidate_href
+from vcd_cli.href_cache import resolve_resource
 from vcd_cli.network import network
 from vcd_cli.utils import restore_session
 from vcd_cli.utils import stderr
@@ -227,6 +229,12 @@ def _get_vdc_ref(ctx):
     return VDC(client, href=in_use_vdc_href)
 
 
+def _get_routed_network(ctx, vdc, name):
+    """Get the routed org vdc network resource, using its cached href."""
+    return resolve_resource(ctx, 'routed_network', name,
+                            lambda: vdc.get_routed_orgvdc_network(name))
+
+
 @routed.command('delete', short_help='delete org vdc routed network')
 @click.pass_context
 @click.argument('name', metavar='<vdc routed network name>', required=True)
@@ -237,6 +245,7 @@ def delete_vdc_routed_network(ctx, name):
         vdc_href = ctx.obj['profiles'].get('vdc_href')
         vdc = VDC(client, href=vdc_href)
         task = vdc.delete_routed_orgvdc_network(name)
+        invalidate_href(ctx, 'routed_network', name)
         stdout(task, ctx)
     except Exception as e:
         stderr(e, ctx)
@@ -271,11 +280,12 @@ def edit_routed_vdc_network(ctx,
     try:
         vdc = _get_vdc_ref(ctx)
         client = ctx.obj['client']
-        routed_network = vdc.get_routed_orgvdc_network(name)
+        routed_network = _get_routed_network(ctx, vdc, name)
         is_shared if is_shared is not None else routed_network.IsShared
         vdcNetwork = VdcNetwork(client, resource=routed_network)
         task = vdcNetwork.edit_name_description_and_shared_state(
             new_vdc_routed_nw_name, description, is_shared)
+        invalidate_href(ctx, 'routed_network', name)
 
         stdout(task, ctx)
         stdout('Routed org vdc network updated successfully.', ctx)
@@ -309,7 +319,7 @@ def add_dns_of_routed_vdc_network(ctx, name, primary_dns_ip, secondary_dns_ip,
     try:
         vdc = _get_vdc_ref(ctx)
         client = ctx.obj['client']
-        routed_network = vdc.get_routed_orgvdc_network(name)
+        routed_network = _get_routed_network(ctx, vdc, name)
         vdcNetwork = VdcNetwork(client, resource=routed_network)
         task = vdcNetwork.add_static_ip_pool_and_dns(
             primary_dns_ip=primary_dns_ip,
@@ -337,7 +347,7 @@ def add_ip_ranges_of_routed_vdc_network(ctx, name, ip_ranges):
     try:
         vdc = _get_vdc_ref(ctx)
         client = ctx.obj['client']
-        routed_network = vdc.get_routed_orgvdc_network(name)
+        routed_network = _get_routed_network(ctx, vdc, name)
         vdcNetwork = VdcNetwork(client, resource=routed_network)
         task = vdcNetwork.add_static_ip_pool_and_dns(ip_ranges)
         stdout(task, ctx)
@@ -388,7 +398,7 @@ def modify_ip_range_of_routed_vdc_network(ctx, name, ip_range, new_ip_range):
     try:
         vdc = _get_vdc_ref(ctx)
         client = ctx.obj['client']
-        routed_network = vdc.get_routed_orgvdc_network(name)
+        routed_network = _get_routed_network(ctx, vdc, name)
         vdcNetwork = VdcNetwork(client, resource=routed_network)
         task = vdcNetwork.modify_static_ip_pool(ip_range, new_ip_range)
         stdout(task, ctx)
@@ -414,7 +424,7 @@ def remove_ip_range(ctx, name, ip_range):
     try:
         vdc = _get_vdc_ref(ctx)
         client = ctx.obj['client']
-        routed_network = vdc.get_routed_orgvdc_network(name)
+        routed_network = _get_routed_network(ctx, vdc, name)
         vdcNetwork = VdcNetwork(client, resource=routed_network)
         task = vdcNetwork.remove_static_ip_pool(ip_range)
         stdout(task, ctx)
@@ -432,7 +442,7 @@ def list_metadata(ctx, name):
     try:
         vdc = _get_vdc_ref(ctx)
         client = ctx.obj['client']
-        routed_network = vdc.get_routed_orgvdc_network(name)
+        routed_network = _get_routed_network(ctx, vdc, name)
         vdcNetwork = VdcNetwork(client, resource=routed_network)
         metadata = vdcNetwork.get_all_metadata()
         result = []
@@ -495,7 +505,7 @@ def set_metadata(ctx, name, key, value, domain, visibility, value_type):
     try:
         vdc = _get_vdc_ref(ctx)
         client = ctx.obj['client']
-        routed_network = vdc.get_routed_orgvdc_network(name)
+        routed_network = _get_routed_network(ctx, vdc, name)
         vdcNetwork = VdcNetwork(client, resource=routed_network)
         task = vdcNetwork.set_metadata(key, value, domain, visibility,
                                        value_type)
@@ -528,7 +538,7 @@ def remove_metadata(ctx, name, key, domain):
     try:
         vdc = _get_vdc_ref(ctx)
         client = ctx.obj['client']
-        routed_network = vdc.get_routed_orgvdc_network(name)
+        routed_network = _get_routed_network(ctx, vdc, name)
         vdcNetwork = VdcNetwork(client, resource=routed_network)
         task = vdcNetwork.remove_metadata(key, domain)
         stdout(task, ctx)
@@ -545,7 +555,7 @@ def list_allocated_ip_address(ctx, name):
     try:
         vdc = _get_vdc_ref(ctx)
         client = ctx.obj['client']
-        routed_network = vdc.get_routed_orgvdc_network(name)
+        routed_network = _get_routed_network(ctx, vdc, name)
         vdcNetwork = VdcNetwork(client, resource=routed_network)
         allocated_ip_addresses = vdcNetwork.list_allocated_ip_address()
         stdout(allocated_ip_addresses, ctx)
@@ -560,7 +570,7 @@ def list_connected_vapps(ctx, name):
     try:
         vdc = _get_vdc_ref(ctx)
         client = ctx.obj['client']
-        routed_network = vdc.get_routed_orgvdc_network(name)
+        routed_network = _get_routed_network(ctx, vdc, name)
         vdcNetwork = VdcNetwork(client, resource=routed_network)
         connected_vapps = vdcNetwork.list_connected_vapps()
         stdout(connected_vapps, ctx)
@@ -576,7 +586,7 @@ def convert_to_sub_interface(ctx, name):
     try:
         vdc = _get_vdc_ref(ctx)
         client = ctx.obj['client']
-        routed_network = vdc.get_routed_orgvdc_network(name)
+        routed_network = _get_routed_network(ctx, vdc, name)
         vdcNetwork = VdcNetwork(client, resource=routed_network)
         task = vdcNetwork.convert_to_sub_interface()
         stdout(task, ctx)
@@ -593,7 +603,7 @@ def convert_to_internal_interface(ctx, name):
     try:
         vdc = _get_vdc_ref(ctx)
         client = ctx.obj['client']
-        routed_network = vdc.get_routed_orgvdc_network(name)
+        routed_network = _get_routed_network(ctx, vdc, name)
         vdcNetwork = VdcNetwork(client, resource=routed_network)
         task = vdcNetwork.convert_to_internal_interface()
         stdout(task, ctx)
@@ -610,7 +620,7 @@ def convert_to_distributed_interface(ctx, name):
     try:
         vdc = _get_vdc_ref(ctx)
         client = ctx.obj['client']
-        routed_network = vdc.get_routed_orgvdc_network(name)
+        routed_network = _get_routed_network(ctx, vdc, name)
         vdcNetwork = VdcNetwork(client, resource=routed_network)
         task = vdcNetwork.convert_to_distributed_interface()
         stdout(task, ctx)
@@ -624,7 +634,7 @@ def convert_to_distributed_interface(ctx, name):
 def info(ctx, name):
     try:
         vdc = _get_vdc_ref(ctx)
-        routed_network = vdc.get_routed_orgvdc_network(name)
+        routed_network = _get_routed_network(ctx, vdc, name)
         output = {}
         output['fence_mode'] = routed_network.Configuration.FenceMode
         output['is_retail_info'] = \
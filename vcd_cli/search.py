@@ -12,13 +12,22 @@
 # conditions of the subcomponent's license, as noted in the LICENSE file.
 #
 
+import collections
+import itertools
+
 import click
 from pyvcloud.vcd.client import QueryResultFormat
 from pyvcloud.vcd.client import RESOURCE_TYPES
+from pyvcloud.vcd.utils import filter_attributes
 from pyvcloud.vcd.utils import to_camel_case
 from pyvcloud.vcd.utils import to_dict
 from tabulate import tabulate
 
+from vcd_cli.query import aggregate_records
+from vcd_cli.query import count_records
+from vcd_cli.query import parse_fields
+from vcd_cli.query import QUERY_PAGE_SIZE
+from vcd_cli.query import query_records
 from vcd_cli.utils import restore_session
 from vcd_cli.utils import stderr
 from vcd_cli.utils import stdout
@@ -36,7 +45,61 @@ from vcd_cli.vcd import vcd
     required=False,
     metavar='[query-filter]',
     help='query filter')
-def search(ctx, resource_type, query_filter):
+@click.option(
+    '--page-size',
+    type=click.IntRange(1),
+    required=False,
+    default=QUERY_PAGE_SIZE,
+    show_default=True,
+    metavar='<number>',
+    help='number of records requested at a time')
+@click.option(
+    '--max-results',
+    type=click.IntRange(0),
+    required=False,
+    default=None,
+    metavar='<number>',
+    help='stop after this many records')
+@click.option(
+    '--page',
+    type=click.IntRange(1),
+    required=False,
+    default=None,
+    metavar='<number>',
+    help='only show the records of this page, starting at 1')
+@click.option(
+    '--fields',
+    required=False,
+    default=None,
+    metavar='<attribute,...>',
+    help='only get these attributes of the records')
+@click.option(
+    '--count',
+    is_flag=True,
+    default=False,
+    help='only show the number of records')
+@click.option(
+    '--group-by',
+    required=False,
+    default=None,
+    metavar='<attribute,...>',
+    help='count the records by the values of these attributes')
+@click.option(
+    '--sum',
+    'sum_fields',
+    required=False,
+    default=None,
+    metavar='<attribute,...>',
+    help='add up these attributes in each group')
+@click.option(
+    '--avg',
+    'avg_fields',
+    required=False,
+    default=None,
+    metavar='<attribute,...>',
+    help='average these attributes in each group')
+def search(ctx, resource_type, query_filter, page_size, max_results, page,
+           fields, count, group_by, sum_fields, avg_fields):
     """Search for resources in vCloud Director.
 
 \b
@@ -81,6 +144,31 @@ def search(ctx, resource_type, query_filter):
 \b
         vcd search vm
             Search for virtual machines.
+\b
+        vcd search adminvm --max-results 1000
+            Search for the first 1000 virtual machines of all organizations,
+            system administrator only.
+\b
+        vcd search vm --page-size 50 --page 3
+            Show the third page of 50 virtual machines.
+\b
+        vcd search adminvm --fields name,vdcName,memoryMB
+            Search for virtual machines, only getting their name, vdc and
+            memory.
+\b
+        vcd search adminvm --filter 'status==POWERED_OFF' --count
+            Count the powered off virtual machines.
+\b
+        vcd search adminvm --group-by vdcName --sum memoryMB,numberOfCpus
+            Count the virtual machines of each vdc and add up their memory
+            and CPUs.
+\b
+        vcd search admintask --group-by orgName,status
+            Count the tasks of each organization by status.
+\b
+        Records are aggregated while they are received, only the groups
+        are kept in memory. Only the attributes used by --group-by, --sum
+        and --avg are requested.
     """
 
     try:
@@ -90,19 +178,58 @@ def search(ctx, resource_type, query_filter):
             click.echo(tabulate(tabulate_names(RESOURCE_TYPES, 4)))
             return
         restore_session(ctx)
-        client = ctx.obj['client']
-        result = []
         resource_type_cc = to_camel_case(resource_type, RESOURCE_TYPES)
-        q = client.get_typed_query(
+        if count:
+            n = count_records(
+                ctx,
+                resource_type_cc,
+                qfilter=query_filter,
+                query_result_format=QueryResultFormat.ID_RECORDS)
+            stdout({'count': n}, ctx, alt_text=str(n))
+            return
+        group_by = parse_fields(group_by)
+        sum_fields = parse_fields(sum_fields)
+        avg_fields = parse_fields(avg_fields)
+        if group_by or sum_fields or avg_fields:
+            aggregated_fields = list(collections.OrderedDict.fromkeys(
+                (group_by or []) + (sum_fields or []) + (avg_fields or [])))
+            records = query_records(
+                ctx,
+                resource_type_cc,
+                qfilter=query_filter,
+                fields=aggregated_fields,
+                limit=max_results,
+                page_size=page_size,
+                page=page,
+                query_result_format=QueryResultFormat.ID_RECORDS)
+            stdout(aggregate_records(records, group_by, sum_fields,
+                                     avg_fields), ctx)
+            return
+        fields = parse_fields(fields)
+        if fields is None:
+            # only the attributes kept by to_dict() are needed
+            query_fields = filter_attributes(resource_type_cc)
+        else:
+            query_fields = fields
+        records = query_records(
+            ctx,
             resource_type_cc,
-            query_result_format=QueryResultFormat.ID_RECORDS,
-            qfilter=query_filter)
-        records = list(q.execute())
-        if len(records) == 0:
-            result = 'not found'
+            qfilter=query_filter,
+            fields=query_fields,
+            limit=max_results,
+            page_size=page_size,
+            page=page,
+            query_result_format=QueryResultFormat.ID_RECORDS)
+        first = next(records, None)
+        if first is None:
+            stdout('not found', ctx, show_id=True)
         else:
-            for r in records:
-                result.append(to_dict(r, resource_type=resource_type_cc))
-        stdout(result, ctx, show_id=True)
+            if fields is None:
+                result = (to_dict(r, resource_type=resource_type_cc)
+                          for r in itertools.chain([first], records))
+            else:
+                result = (to_dict(r, attributes=fields)
+                          for r in itertools.chain([first], records))
+            stdout(result, ctx, show_id=True)
     except Exception as e:
         stderr(e, ctx)
@@ -11,20 +11,64 @@
 # conditions of the subcomponent's license, as noted in the LICENSE file.
 #
 
+import collections
+import datetime
+import itertools
+import json
+import re
+import sys
+import time
+import urllib.parse
+
 import click
 from pyvcloud.vcd.client import EntityType
+from pyvcloud.vcd.client import NSMAP
+from pyvcloud.vcd.client import QueryResultFormat
 from pyvcloud.vcd.client import RelationType
+from pyvcloud.vcd.client import ResourceType
 from pyvcloud.vcd.client import TaskStatus
-from pyvcloud.vcd.task import Task
+from pyvcloud.vcd.exceptions import AccessForbiddenException
+from pyvcloud.vcd.exceptions import EntityNotFoundException
+from pyvcloud.vcd.exceptions import NotFoundException
+from pyvcloud.vcd.exceptions import TaskTimeoutException
+from pyvcloud.vcd.utils import extract_id
 from pyvcloud.vcd.utils import task_to_dict
 from pyvcloud.vcd.utils import to_dict
 
+from vcd_cli.notifications import get_task_listener
+from vcd_cli.notifications import NOTIFICATION_POLL_INTERVAL
+from vcd_cli.query import chunks
+from vcd_cli.query import count_records
+from vcd_cli.query import join_filters
+from vcd_cli.query import parse_fields
+from vcd_cli.query import query_records
 from vcd_cli.utils import as_metavar
+from vcd_cli.utils import get_output_format
+from vcd_cli.utils import get_task_wait_options
 from vcd_cli.utils import restore_session
 from vcd_cli.utils import stderr
 from vcd_cli.utils import stdout
+from vcd_cli.utils import TASK_FIRST_POLL
 from vcd_cli.vcd import vcd
 
+# Attributes shown by 'task list' by default.
+TASK_LIST_FIELDS = [
+    'name', 'status', 'objectName', 'ownerName', 'orgName', 'startDate',
+    'serviceNamespace', 'id'
+]
+
+# Statuses of the tasks that are done.
+DONE_STATUSES = [
+    TaskStatus.SUCCESS.value, TaskStatus.ABORTED.value, TaskStatus.ERROR.value,
+    TaskStatus.CANCELED.value
+]
+
+_DURATION = re.compile(r'^(\d+)([smhdw])$')
+_DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+_TASK_ID = re.compile(r'(?:^|[/:])([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-'
+                      r'[0-9a-f]{4}-[0-9a-f]{12})$', re.IGNORECASE)
+
 
 @vcd.group(short_help='work with tasks')
 @click.pass_context
@@ -35,12 +79,19 @@ def task(ctx):
     Examples
         vcd task list running
             Get list of running tasks.
+\b
+        vcd task list --since 2h --owner alice
+            Get list of the tasks started by user alice in the last two
+            hours.
 \b
         vcd task info 4a115aa5-9657-4d97-a8c2-3faf43fb45dd
             Get details of task by id.
 \b
         vcd task wait 4a115aa5-9657-4d97-a8c2-3faf43fb45dd
             Wait until task is complete.
+\b
+        vcd task wait < tasks.txt
+            Wait until the tasks whose ids are in a file are complete.
 \b
         vcd task update aborted 4a115aa5-9657-4d97-a8c2-3faf43fb45dd
             Abort task by id, requires login as 'system administrator'.
@@ -61,6 +112,34 @@ def info(ctx, task_id):
         stderr(e, ctx)
 
 
+def _to_query_date(value):
+    """Convert a date, or a time before now like '2h', for query filters.
+
+    :param str value: an ISO 8601 date, in local time unless it has a
+        time zone, or a number of seconds, minutes, hours, days or weeks
+        with the unit s, m, h, d or w.
+
+    :return: the url-encoded date, in ISO 8601 with a time zone.
+
+    :rtype: str
+    """
+    match = _DURATION.match(value.strip().lower())
+    if match is not None:
+        seconds = int(match.group(1)) * _DURATION_UNITS[match.group(2)]
+        date = datetime.datetime.now(datetime.timezone.utc) - \
+            datetime.timedelta(seconds=seconds)
+    else:
+        try:
+            date = datetime.datetime.fromisoformat(
+                value.strip().replace('Z', '+00:00'))
+        except ValueError:
+            raise Exception('Invalid date: \'%s\', use a date like '
+                            '2018-06-01T09:30 or a time like 2h.' % value)
+        if date.tzinfo is None:
+            date = date.astimezone()
+    return urllib.parse.quote(date.isoformat(timespec='milliseconds'))
+
+
 @task.command('list', short_help='list tasks')
 @click.pass_context
 @click.argument(
@@ -69,35 +148,318 @@ def info(ctx, task_id):
     metavar=as_metavar(list(TaskStatus.__members__.keys())),
     required=False,
     nargs=-1)
-def list_tasks(ctx, status):
+@click.option(
+    '--since',
+    required=False,
+    default=None,
+    metavar='<date|time>',
+    help='only list the tasks started at or after this date, or this long '
+    'ago, like 2h')
+@click.option(
+    '--until',
+    required=False,
+    default=None,
+    metavar='<date|time>',
+    help='only list the tasks started at or before this date, or this '
+    'long ago')
+@click.option(
+    '--owner',
+    required=False,
+    default=None,
+    metavar='<user-name>',
+    help='only list the tasks of this user')
+@click.option(
+    '--object',
+    'object_name',
+    required=False,
+    default=None,
+    metavar='<name>',
+    help='only list the tasks of the object with this name')
+@click.option(
+    '--operation',
+    required=False,
+    default=None,
+    metavar='<name>',
+    help='only list the tasks of this operation, like vappDeploy')
+@click.option(
+    '--fields',
+    required=False,
+    default=','.join(TASK_LIST_FIELDS),
+    show_default=True,
+    metavar='<attribute,...>',
+    help='attributes to show')
+@click.option(
+    '-l',
+    '--limit',
+    type=click.IntRange(0),
+    required=False,
+    default=None,
+    metavar='<number>',
+    help='maximum number of tasks to list, the most recent ones')
+@click.option(
+    '--count',
+    is_flag=True,
+    default=False,
+    help='only show the number of tasks')
+def list_tasks(ctx, status, since, until, owner, object_name, operation,
+               fields, limit, count):
+    """List tasks, the most recent first.
+
+\b
+    Description
+        Tasks are queried, filtered and sorted by vCloud Director. They are
+        printed a page at a time while the query runs, the width of the
+        columns is taken from the first rows.
+\b
+        Dates are in ISO 8601, like 2018-06-01 or 2018-06-01T09:30, in
+        local time unless they have a time zone. Times before now are
+        given in seconds, minutes, hours, days or weeks, like 30s, 15m,
+        2h, 7d or 1w. Names can have '*' wildcards.
+\b
+    Examples
+        vcd task list RUNNING
+            List the running tasks.
+\b
+        vcd task list --since 2h
+            List the tasks started in the last two hours.
+\b
+        vcd task list ERROR --since 2018-06-01 --until 2018-06-02
+            List the tasks that failed on June 1st.
+\b
+        vcd task list --owner alice --operation 'vapp*' --limit 20
+            List the last 20 vApp tasks of user alice.
+\b
+        vcd task list --object vapp1 --since 1d --count
+            Count the tasks of vApp 'vapp1' in the last day.
+    """
     try:
         restore_session(ctx)
         client = ctx.obj['client']
-        task_obj = Task(client)
-        records = task_obj.list_tasks(filter_status_list=status)
-        result = []
-        for r in records:
-            result.append(
-                to_dict(
-                    r,
-                    attributes=[
-                        'name', 'status', 'objectName', 'ownerName', 'orgName',
-                        'startDate', 'serviceNamespace', 'id'
-                    ]))
-        stdout(result, ctx, show_id=True)
+        if client.is_sysadmin():
+            resource_type = ResourceType.ADMIN_TASK.value
+        else:
+            resource_type = ResourceType.TASK.value
+        qfilter = join_filters(
+            ','.join('status==%s' % urllib.parse.quote(s) for s in status),
+            None if since is None else 'startDate=ge=%s' %
+            _to_query_date(since),
+            None if until is None else 'startDate=le=%s' %
+            _to_query_date(until),
+            None if owner is None else 'ownerName==%s' %
+            urllib.parse.quote(owner, safe='*'),
+            None if object_name is None else 'objectName==%s' %
+            urllib.parse.quote(object_name, safe='*'),
+            None if operation is None else 'name==%s' %
+            urllib.parse.quote(operation, safe='*'))
+        if count:
+            n = count_records(
+                ctx,
+                resource_type,
+                qfilter=qfilter,
+                query_result_format=QueryResultFormat.ID_RECORDS)
+            stdout({'count': n}, ctx, alt_text=str(n))
+            return
+        fields = parse_fields(fields)
+        records = query_records(
+            ctx,
+            resource_type,
+            qfilter=qfilter,
+            sort_desc='startDate',
+            fields=fields,
+            limit=limit,
+            query_result_format=QueryResultFormat.ID_RECORDS)
+        first = next(records, None)
+        if first is None:
+            stdout('No tasks were found.', ctx)
+        else:
+            stdout((to_dict(r, attributes=fields)
+                    for r in itertools.chain([first], records)),
+                   ctx, show_id=True)
     except Exception as e:
         stderr(e, ctx)
 
 
-@task.command(short_help='wait until task is complete')
+def _parse_task_ids(text):
+    """Find the ids of tasks in text.
+
+    The text has ids, urns or hrefs of tasks separated by spaces or lines,
+    or tasks printed as JSON, like the output of 'vcd -n -j' commands.
+
+    :rtype: list
+    """
+    try:
+        tasks = [json.loads(text)]
+    except ValueError:
+        tasks = []
+        for line in text.splitlines():
+            try:
+                tasks.append(json.loads(line))
+            except ValueError:
+                tasks.extend(line.split())
+    # the JSON output of list commands is a list of tasks
+    while any(isinstance(t, list) for t in tasks):
+        tasks = list(itertools.chain.from_iterable(
+            t if isinstance(t, list) else [t] for t in tasks))
+    task_ids = []
+    for t in tasks:
+        if isinstance(t, dict):
+            t = t.get('href') or t.get('id') or ''
+        match = _TASK_ID.search(str(t))
+        if match is None:
+            raise Exception('Invalid task id: \'%s\'' % t)
+        task_ids.append(match.group(1).lower())
+    return task_ids
+
+
+def _task_result(ctx, task_id, task, start):
+    result = {
+        'id': task_id,
+        'operation': task.get('operationName') or task.get('name'),
+        'object': task.get('objectName'),
+        'status': task.get('status'),
+        'wait_seconds': round(time.time() - start, 3)
+    }
+    if result['status'] == TaskStatus.ERROR.value:
+        client = ctx.obj['client']
+        error = client.get_resource(
+            f"{client.get_api_uri()}/task/{task_id}").find(
+                '{' + NSMAP['vcloud'] + '}Error')
+        if error is not None:
+            result['message'] = error.get('message')
+    return result
+
+
+def _wait_for_tasks(ctx, task_ids):
+    """Wait until tasks are done, with a query per poll of all of them.
+
+    When notifications of tasks are received from the AMQP broker, only
+    the notified tasks are queried, and all of them every
+    NOTIFICATION_POLL_INTERVAL seconds.
+
+    :return: the result of each task, when it is done.
+
+    :rtype: generator of dict
+    """
+    client = ctx.obj['client']
+    if client.is_sysadmin():
+        resource_type = ResourceType.ADMIN_TASK.value
+    else:
+        resource_type = ResourceType.TASK.value
+    timeout, poll_interval = get_task_wait_options(ctx)
+    start = time.time()
+    interval = min(TASK_FIRST_POLL, poll_interval)
+    pending = set(task_ids)
+    listener = get_task_listener(ctx, task_ids)
+    checked = set(pending)
+    while True:
+        found = set()
+        for ids in chunks(checked):
+            for record in query_records(
+                    ctx,
+                    resource_type,
+                    qfilter=','.join('id==%s' % i for i in ids),
+                    query_result_format=QueryResultFormat.ID_RECORDS):
+                task_id = extract_id(record.get('id'))
+                found.add(task_id)
+                if record.get('status') in DONE_STATUSES:
+                    pending.discard(task_id)
+                    yield _task_result(ctx, task_id, record, start)
+        # tasks the query doesn't return are looked up one by one
+        for task_id in sorted(checked - found):
+            try:
+                task = client.get_resource(
+                    f"{client.get_api_uri()}/task/{task_id}")
+            except (AccessForbiddenException, EntityNotFoundException,
+                    NotFoundException):
+                pending.discard(task_id)
+                yield {'id': task_id, 'status': 'not found'}
+                continue
+            if task.get('status') in DONE_STATUSES:
+                pending.discard(task_id)
+                yield _task_result(ctx, task_id, task, start)
+        if len(pending) == 0:
+            return
+        remaining = start + timeout - time.time()
+        if remaining <= 0:
+            raise TaskTimeoutException(
+                '%d task(s) not done after %g seconds: %s' %
+                (len(pending), timeout, ', '.join(sorted(pending))))
+        if listener is not None:
+            checked = listener.wait(
+                pending, min(NOTIFICATION_POLL_INTERVAL, remaining))
+            if checked is None:
+                listener = None
+            elif len(checked) == 0:
+                checked = set(pending)
+        if listener is None:
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, poll_interval)
+            checked = set(pending)
+
+
+@task.command(short_help='wait until tasks are complete')
 @click.pass_context
-@click.argument('task_id', metavar='<id>', required=True)
-def wait(ctx, task_id):
+@click.argument('task_ids', metavar='[id]...', nargs=-1, required=False)
+def wait(ctx, task_ids):
+    """Wait until tasks are complete.
+
+\b
+    Description
+        Waits for the tasks with the given ids, or with the ids read from
+        the standard input when there are none or the id is '-'. The
+        standard input can also have the JSON output of commands run with
+        --no-wait.
+\b
+        All the tasks are polled together, with a query per poll, or
+        only queried when notified by the AMQP broker if VCD_AMQP_URL is
+        set, see 'vcd --help'.
+        Each task is printed when it is done. The exit code is 1 when a
+        task didn't succeed.
+\b
+    Examples
+        vcd task wait 4a115aa5-9657-4d97-a8c2-3faf43fb45dd
+            Wait until a task is complete.
+\b
+        vcd -n -o ndjson vapp power-on vapp1 > tasks.json
+        vcd -n -o ndjson vapp power-on vapp2 >> tasks.json
+        vcd task wait < tasks.json
+            Power on vApps at the same time and wait until they are on.
+    """
     try:
         restore_session(ctx)
-        client = ctx.obj['client']
-        task = client.get_resource(f"{client.get_api_uri()}/task/{task_id}")
-        stdout(task, ctx)
+        if len(task_ids) == 0 or task_ids == ('-',):
+            task_ids = _parse_task_ids(sys.stdin.read())
+        else:
+            task_ids = _parse_task_ids('\n'.join(task_ids))
+        if len(task_ids) == 0:
+            raise Exception('No task ids.')
+        failed = False
+        results = _wait_for_tasks(ctx, list(collections.OrderedDict.fromkeys(
+            task_ids)))
+        if get_output_format(ctx) == 'table':
+            for result in results:
+                failed = failed or result['status'] != TaskStatus.SUCCESS.value
+                text = 'task: %s, ' % result['id']
+                if result.get('operation') is not None:
+                    text += '%s, ' % result['operation']
+                text += 'result: %s' % result['status']
+                if 'message' in result:
+                    text += ', message: %s' % result['message']
+                click.echo(text)
+        else:
+
+            def track(results):
+                nonlocal failed
+                for result in results:
+                    if result['status'] != TaskStatus.SUCCESS.value:
+                        failed = True
+                    yield result
+
+            stdout(track(results), ctx)
+        if failed:
+            ctx.exit(1)
+    except click.exceptions.Exit:
+        raise
     except Exception as e:
         stderr(e, ctx)
 
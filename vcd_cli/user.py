@@ -12,10 +12,16 @@
 # conditions of the subcomponent's license, as noted in the LICENSE file.
 #
 
+import urllib.parse
+
 import click
+from pyvcloud.vcd.client import ResourceType
 from pyvcloud.vcd.org import Org
 from pyvcloud.vcd.utils import to_dict
 
+from vcd_cli.query import count_records
+from vcd_cli.query import parse_fields
+from vcd_cli.query import query_records
 from vcd_cli.utils import restore_session
 from vcd_cli.utils import stderr
 from vcd_cli.utils import stdout
@@ -248,7 +254,18 @@ def update(ctx, user_name, is_enabled):
     metavar='[org-name]',
     help='name of the org',
 )
-def list_users(ctx, org_name):
+@click.option(
+    '--fields',
+    required=False,
+    default=None,
+    metavar='<attribute,...>',
+    help='only get these attributes of the users')
+@click.option(
+    '--count',
+    is_flag=True,
+    default=False,
+    help='only show the number of users')
+def list_users(ctx, org_name, fields, count):
     try:
         restore_session(ctx)
         client = ctx.obj['client']
@@ -256,17 +273,25 @@ def list_users(ctx, org_name):
             org_href = client.get_org_by_name(org_name).get('href')
         else:
             org_href = ctx.obj['profiles'].get('org_href')
-        org = Org(client, href=org_href)
-        users = org.list_users()
-        result = []
-        for record in list(users):
-            result.append(
-                to_dict(
-                    record,
-                    exclude=[
-                        'org', 'orgName', 'deployedVMQuotaRank',
-                        'storedVMQuotaRank'
-                    ]))
+        if client.is_sysadmin():
+            resource_type = ResourceType.ADMIN_USER.value
+            org_filter = 'org==%s' % urllib.parse.quote(org_href)
+        else:
+            resource_type = ResourceType.USER.value
+            org_filter = None
+        if count:
+            n = count_records(ctx, resource_type, qfilter=org_filter)
+            stdout({'count': n}, ctx, alt_text=str(n))
+            return
+        fields = parse_fields(fields)
+        users = query_records(
+            ctx, resource_type, qfilter=org_filter, fields=fields)
+        result = (to_dict(
+            record,
+            attributes=fields,
+            exclude=[
+                'org', 'orgName', 'deployedVMQuotaRank', 'storedVMQuotaRank'
+            ]) for record in users)
         stdout(result, ctx)
     except Exception as e:
         stderr(e, ctx)
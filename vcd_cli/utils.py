@@ -12,18 +12,24 @@
 # conditions of the subcomponent's license, as noted in the LICENSE file.
 #
 from collections import abc
+import csv
+import itertools
 import json
 from os import environ
 import re
 import sys
+import time
 import traceback
 
 import click
 from colorama import Fore
+from lxml import etree
+from lxml import objectify
 from lxml.objectify import ObjectifiedElement
 from pygments import formatters
 from pygments import highlight
 from pygments import lexers
+from pyvcloud.vcd.client import _get_session_endpoints
 from pyvcloud.vcd.client import Client
 from pyvcloud.vcd.client import EntityType
 from pyvcloud.vcd.client import get_logger
@@ -32,46 +38,193 @@ from pyvcloud.vcd.client import TaskStatus
 from pyvcloud.vcd.exceptions import AccessForbiddenException
 from pyvcloud.vcd.exceptions import InvalidParameterException
 from pyvcloud.vcd.exceptions import RequestTimeoutException
+from pyvcloud.vcd.exceptions import TaskTimeoutException
 from pyvcloud.vcd.exceptions import UnauthorizedException
 from pyvcloud.vcd.utils import extract_id
+from pyvcloud.vcd.utils import task_to_dict
 from pyvcloud.vcd.utils import to_dict
 import requests
 from tabulate import tabulate
 
+from vcd_cli.notifications import get_task_listener
+from vcd_cli.notifications import NOTIFICATION_POLL_INTERVAL
 from vcd_cli.profiles import Profiles
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 LOGGER = get_logger(file_name='vcd_cli_error.log')
 
+# Restored clients by session, only used by long running processes like the
+# vcd daemon, see enable_session_cache().
+_session_cache = None
+
+# Rows used to size the columns of tables printed while their rows are
+# still being produced, see as_table_stream().
+TABLE_STREAM_ROWS = 100
+
+# Seconds to wait for a task before giving up, and maximum seconds between
+# two polls of the task, see --task-timeout and --poll-interval.
+TASK_TIMEOUT = 600
+TASK_POLL_INTERVAL = 5
+
+# Seconds before the first poll of a task, the interval then doubles at
+# each poll up to the poll interval.
+TASK_FIRST_POLL = 0.25
+
+# Seconds during which a session validated with the server is trusted
+# without validating it again, VCD_SESSION_VALIDATION_TTL overrides it.
+SESSION_VALIDATION_TTL = 300
+
+# Versions of pyvcloud whose Client can be given a session without
+# validating it, see _set_client_session().
+PYVCLOUD_SESSION_VERSIONS = ('23.',)
+
 
 def is_sysadmin(ctx):
     org_name = ctx.obj['profiles'].get('org')
     return org_name.lower() == 'system'
 
 
+def _collect_rows(objs, show_id, hide_fields):
+    """Turn dictionaries into table rows in a single pass.
+
+    :return: the column names, in order of appearance, the index of each
+        name (negative for hidden ones), the rows as lists of strings
+        indexed like the names, the width of each column, whether each
+        column only has numbers (None if it's empty) and whether any value
+        spans several lines.
+
+    :rtype: tuple
+    """
+    keys = []
+    index = {k: -1 for k in hide_fields}
+    if not show_id:
+        index['id'] = -1
+    widths = []
+    numeric = []
+    rows = []
+    multiline = False
+    for obj in objs:
+        row = [''] * len(keys)
+        for k, v in obj.items():
+            i = index.get(k)
+            if i is None:
+                i = index[k] = len(keys)
+                keys.append(k)
+                widths.append(len(str(k)))
+                numeric.append(None)
+                row.append('')
+            elif i < 0:
+                continue
+            if v is None:
+                continue
+            cell = v if type(v) is str else str(v)
+            if len(cell) > widths[i]:
+                widths[i] = len(cell)
+            if numeric[i] is not False and cell != '':
+                try:
+                    float(cell)
+                    numeric[i] = True
+                except ValueError:
+                    numeric[i] = False
+            if '\n' in cell:
+                multiline = True
+            row[i] = cell
+        rows.append(row)
+    return keys, index, rows, widths, numeric, multiline
+
+
+def _row_format(keys, widths, numeric, sort_headers):
+    """Format string of a table row, used with str.format(*row)."""
+    order = range(len(keys))
+    if sort_headers:
+        order = sorted(order, key=lambda i: keys[i])
+    return '  '.join(
+        '{%d:%s%d}' % (i, '>' if numeric[i] else '<', widths[i])
+        for i in order)
+
+
+def _table_lines(keys, rows, widths, numeric, sort_headers, show_headers):
+    row_format = _row_format(keys, widths, numeric, sort_headers)
+    if show_headers:
+        yield row_format.format(*keys).rstrip()
+        yield row_format.format(*['-' * w for w in widths])
+    count = len(keys)
+    for row in rows:
+        if len(row) < count:
+            row.extend([''] * (count - len(row)))
+        yield row_format.format(*row).rstrip()
+
+
 def as_table(obj_list,
              show_id=False,
              sort_headers=True,
              hide_fields=['href', 'type'],
              show_headers=True):
-    if len(obj_list) == 0:
+    """Format dictionaries as a table.
+
+    The columns are the union of the keys of all the dictionaries. Columns
+    of numbers are right aligned, missing values are left empty.
+    """
+    keys, index, rows, widths, numeric, multiline = _collect_rows(
+        obj_list, show_id, hide_fields)
+    if len(rows) == 0:
         return ''
-    else:
+    if multiline:
+        # tabulate knows how to lay out cells with several lines
         if sort_headers:
-            headers = sorted(obj_list[0].keys())
+            order = sorted(range(len(keys)), key=lambda i: keys[i])
         else:
-            headers = obj_list[0].keys()
-        if not show_id and 'id' in headers:
-            headers.remove('id')
-        for field in hide_fields:
-            if field in headers:
-                headers.remove(field)
-        table = []
-        for obj in obj_list:
-            table.append(
-                [obj.get(k) if k in obj.keys() else '' for k in headers])
+            order = range(len(keys))
+        table = [[row[i] if i < len(row) else '' for i in order]
+                 for row in rows]
         if show_headers:
-            return tabulate(table, headers)
+            return tabulate(table, [keys[i] for i in order])
         return tabulate(table)
+    return '\n'.join(
+        _table_lines(keys, rows, widths, numeric, sort_headers,
+                     show_headers))
+
+
+def as_table_stream(objs,
+                    show_id=False,
+                    sort_headers=True,
+                    hide_fields=['href', 'type'],
+                    show_headers=True,
+                    first_rows=TABLE_STREAM_ROWS):
+    """Format dictionaries as a table while they are produced.
+
+    The columns and their widths are found in the first rows, and used for
+    the rows that follow, which are formatted as they come. Values wider
+    than their column are not truncated, keys that were not seen in the
+    first rows are left out.
+
+    :param iterator objs: the dictionaries, one per row.
+
+    :return: the text of the table, a line or more at a time.
+
+    :rtype: generator of str
+    """
+    objs = iter(objs)
+    keys, index, rows, widths, numeric, multiline = _collect_rows(
+        itertools.islice(objs, first_rows), show_id, hide_fields)
+    if len(rows) == 0:
+        return
+    yield '\n'.join(
+        _table_lines(keys, rows, widths, numeric, sort_headers,
+                     show_headers))
+    row_format = _row_format(keys, widths, numeric, sort_headers)
+    count = len(keys)
+    for obj in objs:
+        row = [''] * count
+        for k, v in obj.items():
+            i = index.get(k)
+            if i is not None and i >= 0 and v is not None:
+                row[i] = v if type(v) is str else str(v)
+        yield row_format.format(*row).rstrip()
 
 
 def as_prop_value_list(obj, show_id=True):
@@ -93,6 +246,142 @@ def as_metavar(values):
     return result
 
 
+def enable_session_cache():
+    """Keep the clients restored by restore_session() for later commands.
+
+    Commands run afterwards in this process reuse the client of their
+    session, and its open connections, instead of rehydrating a new one.
+    """
+    global _session_cache
+    if _session_cache is None:
+        _session_cache = {}
+
+
+def get_session_cache():
+    return _session_cache
+
+
+def get_session_validation_ttl():
+    try:
+        return int(environ.get('VCD_SESSION_VALIDATION_TTL',
+                               SESSION_VALIDATION_TTL))
+    except ValueError:
+        return SESSION_VALIDATION_TTL
+
+
+def save_session_validation(profiles, client):
+    """Save in the profile that its session has just been validated.
+
+    The session resource returned by the server is kept as well, it has
+    the links needed to restore the session without validating it again.
+    """
+    if get_session_validation_ttl() <= 0:
+        return
+    with profiles.transaction():
+        profiles.set('session_validated_at', int(time.time()))
+        profiles.set('session', etree.tostring(
+            client.get_vcloud_session()).decode('utf-8'))
+
+
+def clear_session_validation(profiles):
+    with profiles.transaction():
+        profiles.set('session_validated_at', 0)
+        profiles.set('session', '')
+
+
+def _get_pyvcloud_version():
+    try:
+        from importlib import metadata
+        return metadata.version('pyvcloud')
+    except ImportError:
+        import pkg_resources
+        return pkg_resources.require('pyvcloud')[0].version
+    except Exception:
+        return None
+
+
+def _set_client_session(client, token, is_jwt_token, vcloud_session,
+                        on_rejected):
+    """Give a client a session without getting it from the server.
+
+    It sets the private attributes of pyvcloud's Client that
+    Client.rehydrate_from_token() sets, so it is only done with the
+    versions of pyvcloud in PYVCLOUD_SESSION_VERSIONS.
+
+    The first request of the client tells if the server still accepts the
+    session. If it doesn't, on_rejected() is called to get a new session
+    and that request only is sent again.
+
+    :return: True if the session was set, False if the version of pyvcloud
+        isn't supported.
+
+    :rtype: bool
+    """
+    version = _get_pyvcloud_version()
+    if version is None or not version.startswith(PYVCLOUD_SESSION_VERSIONS):
+        return False
+    http_session = requests.Session()
+    if is_jwt_token:
+        client._vcloud_access_token = token
+        http_session.headers[client._HEADER_AUTHORIZATION_NAME] = \
+            'Bearer ' + token
+    else:
+        client._vcloud_auth_token = token
+        http_session.headers[client._HEADER_X_VCLOUD_AUTH_NAME] = token
+    client._session = http_session
+    client._vcloud_session = vcloud_session
+    client._update_is_sysadmin()
+    client._session_endpoints = _get_session_endpoints(vcloud_session)
+    do_request_prim = client._do_request_prim
+
+    def first_request(method, uri, session, *args, **kwargs):
+        # the following requests go straight to the client
+        client.__dict__.pop('_do_request_prim', None)
+        response = do_request_prim(method, uri, session, *args, **kwargs)
+        if response.status_code == requests.codes.unauthorized and \
+                session is http_session:
+            on_rejected()
+            response = do_request_prim(method, uri, client._session, *args,
+                                       **kwargs)
+        return response
+
+    client._do_request_prim = first_request
+    return True
+
+
+def _validate_session(client, profiles):
+    """Get the session of the profile's token from the server."""
+    client.rehydrate_from_token(
+        profiles.get('token'), profiles.get('is_jwt_token'))
+    save_session_validation(profiles, client)
+
+
+def _restore_validated_session(client, profiles):
+    """Restore the session of the profile without validating it.
+
+    Only possible if the session was validated within the TTL, see
+    save_session_validation(). If the server rejects it, it is validated
+    again by the first request, see _set_client_session().
+
+    :return: True if the session was restored.
+
+    :rtype: bool
+    """
+    validated_at = profiles.get('session_validated_at')
+    session = profiles.get('session')
+    if not validated_at or not session or \
+            time.time() - validated_at > get_session_validation_ttl():
+        return False
+
+    def on_rejected():
+        clear_session_validation(profiles)
+        _validate_session(client, profiles)
+
+    return _set_client_session(
+        client, profiles.get('token'), profiles.get('is_jwt_token'),
+        objectify.fromstring(session.encode('utf-8')), on_rejected)
+
+
 def restore_session(ctx, vdc_required=False):
     if type(ctx.obj) is dict and 'client' in ctx.obj and ctx.obj['client']:
         return
@@ -113,16 +402,24 @@ def restore_session(ctx, vdc_required=False):
                 err=True)
         requests.packages.urllib3.disable_warnings()
 
-    client = Client(
-        profiles.get('host'),
-        api_version=profiles.get('api_version'),
-        verify_ssl_certs=profiles.get('verify'),
-        log_file='vcd.log',
-        log_requests=profiles.get('log_request'),
-        log_headers=profiles.get('log_header'),
-        log_bodies=profiles.get('log_body'))
-    client.rehydrate_from_token(
-        profiles.get('token'), profiles.get('is_jwt_token'))
+    client = None
+    session_key = (profiles.get('host'), profiles.get('api_version'),
+                   profiles.get('verify'), token)
+    if _session_cache is not None:
+        client = _session_cache.get(session_key)
+    if client is None:
+        client = Client(
+            profiles.get('host'),
+            api_version=profiles.get('api_version'),
+            verify_ssl_certs=profiles.get('verify'),
+            log_file='vcd.log',
+            log_requests=profiles.get('log_request'),
+            log_headers=profiles.get('log_header'),
+            log_bodies=profiles.get('log_body'))
+        if not _restore_validated_session(client, profiles):
+            _validate_session(client, profiles)
+        if _session_cache is not None:
+            _session_cache[session_key] = client
 
     ctx.obj = {}
     ctx.obj['client'] = client
@@ -162,62 +459,237 @@ def task_callback(task):
     click.secho(message, nl=False)
 
 
+def get_task_wait_options(ctx):
+    """Get the --task-timeout and --poll-interval of the command.
+
+    The options can be given to vcd or to the command itself, which takes
+    precedence.
+
+    :return: the timeout and the maximum interval between polls, in
+        seconds.
+
+    :rtype: tuple
+    """
+    if ctx is None:
+        return TASK_TIMEOUT, TASK_POLL_INTERVAL
+    return (ctx.meta.get('task_timeout', TASK_TIMEOUT),
+            ctx.meta.get('poll_interval', TASK_POLL_INTERVAL))
+
+
+def _is_task_done(task):
+    return task.get('status').lower() in [
+        TaskStatus.SUCCESS.value, TaskStatus.ABORTED.value,
+        TaskStatus.ERROR.value, TaskStatus.CANCELED.value
+    ]
+
+
+def wait_for_task(ctx, task, callback=None):
+    """Wait until a task is done.
+
+    The task is polled TASK_FIRST_POLL seconds after it's returned, then
+    the interval between polls doubles up to the poll interval, so that
+    short tasks are seen done quickly without polling long ones too often.
+
+    When notifications of tasks are received from the AMQP broker of vCloud
+    Director, see vcd_cli.notifications, the task is only fetched when a
+    notification about it arrives instead.
+
+    :param click.core.Context ctx: click context with a restored session.
+    :param lxml.objectify.ObjectifiedElement task: the task.
+    :param function callback: called with the task after each poll.
+
+    :return: the task when it succeeded, failed or was canceled.
+
+    :rtype: lxml.objectify.ObjectifiedElement
+
+    :raises TaskTimeoutException: if the task isn't done after the task
+        timeout.
+    """
+    timeout, poll_interval = get_task_wait_options(ctx)
+    client = ctx.obj['client']
+    deadline = time.time() + timeout
+    interval = min(TASK_FIRST_POLL, poll_interval)
+    task_id = extract_id(task.get('id'))
+    listener = None
+    if not _is_task_done(task):
+        listener = get_task_listener(ctx, [task_id])
+        if listener is not None:
+            # the task may be done before the listener subscribed to it
+            task = client.get_resource(task.get('href'))
+    while not _is_task_done(task):
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise TaskTimeoutException(
+                'Task %s is not done after %g seconds, use \'vcd task wait\''
+                ' to keep waiting for it.' % (task_id, timeout))
+        if listener is not None and listener.wait(
+                {task_id}, min(NOTIFICATION_POLL_INTERVAL, remaining)) is None:
+            listener = None
+        if listener is None:
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, poll_interval)
+        task = client.get_resource(task.get('href'))
+        if callback is not None:
+            callback(task)
+    return task
+
+
+def get_output_format(ctx):
+    """Get the output format selected with --output or --json.
+
+    :return: one of 'table', 'json', 'ndjson', 'csv' or 'tsv'.
+
+    :rtype: str
+    """
+    if ctx is None:
+        return 'table'
+    params = ctx.find_root().params
+    if params.get('json_output'):
+        return 'json'
+    return params.get('output') or 'table'
+
+
+def _is_tty():
+    try:
+        return sys.stdout.isatty()
+    except Exception:
+        return False
+
+
+def is_colorized(ctx):
+    """Tell if the output is highlighted, only a terminal gets colors."""
+    return ctx.find_root().params['is_colorized'] and _is_tty()
+
+
+def _to_ndjson(obj):
+    if orjson is not None:
+        try:
+            options = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+            return orjson.dumps(obj, option=options).decode('utf-8')
+        except TypeError:
+            pass
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'))
+
+
+def _to_json(obj, ctx):
+    """Encode the JSON output of a command.
+
+    The output is indented, and highlighted when --colorized, only when it
+    is written to a terminal. Otherwise it is printed on a single line,
+    encoded with orjson when it is installed.
+    """
+    if not _is_tty():
+        return _to_ndjson(obj)
+    text = json.dumps(obj, sort_keys=True, indent=4, separators=(',', ': '))
+    if is_colorized(ctx):
+        text = highlight(text, lexers.JsonLexer(),
+                         formatters.TerminalFormatter())
+    return text
+
+
+def _delimited_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value, sort_keys=True, separators=(',', ':'))
+    return value
+
+
+def write_delimited(objs, delimiter=',', first_rows=TABLE_STREAM_ROWS):
+    """Write dictionaries as CSV rows while they are produced.
+
+    The columns are the keys of the first rows, sorted, and are the same
+    for all the rows. Keys that were not seen in the first rows are left
+    out, missing values are left empty.
+
+    :param iterator objs: the dictionaries, one per row.
+    :param str delimiter: ',' for CSV, '\t' for TSV.
+    :param int first_rows: number of rows the columns are taken from.
+    """
+    objs = iter(objs)
+    first = list(itertools.islice(objs, first_rows))
+    if len(first) == 0:
+        return
+    keys = sorted(set(k for obj in first for k in obj.keys()))
+    writer = csv.writer(sys.stdout, delimiter=delimiter, lineterminator='\n')
+    writer.writerow(keys)
+    for obj in itertools.chain(first, objs):
+        writer.writerow([_delimited_cell(obj.get(k)) for k in keys])
+
+
 def stdout(obj, ctx=None, alt_text=None, show_id=False,
            sort_headers=True, show_headers=True):
     global last_message
     last_message = ''
+    output_format = get_output_format(ctx)
+    if isinstance(obj, dict) and 'task_href' in obj:
+        obj = ctx.obj['client'].get_resource(obj.get('task_href'))
+    wait_seconds = None
+    if isinstance(obj, ObjectifiedElement) and \
+            obj.tag == '{' + NSMAP['vcloud'] + '}Task':
+        if not ctx.find_root().params.get('no_wait'):
+            start = time.time()
+            obj = wait_for_task(
+                ctx, obj,
+                callback=task_callback if output_format == 'table' else None)
+            wait_seconds = round(time.time() - start, 3)
+        if output_format != 'table':
+            # the time spent waiting for the task is part of its result
+            obj = task_to_dict(obj)
+            if wait_seconds is not None:
+                obj['wait_seconds'] = wait_seconds
     o = obj
-    if ctx is not None and \
-       'json_output' in ctx.find_root().params and \
-       ctx.find_root().params['json_output']:
+    if output_format == 'ndjson':
         if isinstance(obj, str):
-            o = {'message': obj}
-        text = json.dumps(o, sort_keys=True, indent=4, separators=(',', ': '))
-        if sys.version_info[0] < 3:
-            text = str(text, 'utf-8')
-        if ctx.find_root().params['is_colorized']:
-            click.echo(
-                highlight(text, lexers.JsonLexer(),
-                          formatters.TerminalFormatter()))
+            obj = {'message': obj}
+        if isinstance(obj, (list, abc.Iterator)):
+            # records are printed as they come, one per line
+            for record in obj:
+                click.echo(_to_ndjson(record))
         else:
-            click.echo(text)
+            click.echo(_to_ndjson(obj))
+    elif output_format in ('csv', 'tsv'):
+        if isinstance(obj, str):
+            obj = {'message': obj}
+        elif isinstance(obj, ObjectifiedElement):
+            obj = to_dict(obj)
+        if isinstance(obj, dict):
+            obj = [obj]
+        write_delimited(obj, ',' if output_format == 'csv' else '\t')
+    elif output_format == 'json':
+        if isinstance(obj, str):
+            o = {'message': obj}
+        elif isinstance(obj, abc.Iterator):
+            o = list(obj)
+        click.echo(_to_json(o, ctx))
     else:
         if alt_text is not None:
             text = alt_text
+        elif isinstance(obj, abc.Iterator):
+            # records streamed from a query, print them as they come
+            for text in as_table_stream(obj, show_id=show_id,
+                                        sort_headers=sort_headers,
+                                        show_headers=show_headers):
+                click.echo(text)
+            return
         elif isinstance(obj, str):
             text = o
         else:
-            if 'task_href' in obj:
-                obj = ctx.obj['client'].get_resource(obj.get('task_href'))
             if isinstance(obj, ObjectifiedElement):
                 if obj.tag == '{' + NSMAP['vcloud'] + '}Task':
-                    if ctx is not None and \
-                       'no_wait' in ctx.find_root().params and \
-                       ctx.find_root().params['no_wait']:
+                    if wait_seconds is None:
                         text = as_prop_value_list(obj, show_id=show_id)
+                    elif obj.get('status') == TaskStatus.ERROR.value:
+                        text = 'task: %s, result: %s, message: %s' % \
+                               (extract_id(obj.get('id')),
+                                obj.get('status'),
+                                obj.Error.get('message'))
+                        # TODO(should return != 0)
                     else:
-                        client = ctx.obj['client']
-                        task = client.get_task_monitor().wait_for_status(
-                            task=obj,
-                            timeout=60,
-                            poll_frequency=5,
-                            fail_on_statuses=None,
-                            expected_target_statuses=[
-                                TaskStatus.SUCCESS, TaskStatus.ABORTED,
-                                TaskStatus.ERROR, TaskStatus.CANCELED
-                            ],
-                            callback=task_callback)
-                        if task.get('status') == TaskStatus.ERROR.value:
-                            text = 'task: %s, result: %s, message: %s' % \
-                                   (extract_id(task.get('id')),
-                                    task.get('status'),
-                                    task.Error.get('message'))
-                            # TODO(should return != 0)
-                        else:
-                            text = 'task: %s, %s, result: %s' % \
-                                   (extract_id(task.get('id')),
-                                    task.get('operation'),
-                                    task.get('status'))
+                        text = 'task: %s, %s, result: %s' % \
+                               (extract_id(obj.get('id')),
+                                obj.get('operation'),
+                                obj.get('status'))
                 elif ctx.command.name == 'list' and \
                         isinstance(obj, abc.Iterable):
                     text = as_table(obj)
@@ -251,6 +723,13 @@ def stdout(obj, ctx=None, alt_text=None, show_id=False,
 
 
 def stderr(exception, ctx=None):
+    if type(exception) == UnauthorizedException:
+        if _session_cache:
+            _session_cache.clear()
+        if ctx is not None and type(ctx.obj) is dict and \
+                'profiles' in ctx.obj:
+            # the next command validates the session with the server
+            clear_session_validation(ctx.obj['profiles'])
     try:
         LOGGER.error(traceback.format_exc())
     except Exception:
@@ -267,18 +746,12 @@ def stderr(exception, ctx=None):
         message = exception.message
     else:
         message = str(exception)
-    if ctx is not None and ctx.find_root().params['json_output']:
-        message = {'error': str(message)}
-        text = json.dumps(
-            message, sort_keys=True, indent=4, separators=(',', ': '))
-        if sys.version_info[0] < 3:
-            text = str(text, 'utf-8')
-        if ctx.find_root().params['is_colorized']:
-            message = highlight(text, lexers.JsonLexer(),
-                                formatters.TerminalFormatter())
-        else:
-            message = text
-        click.echo(message)
+    output_format = get_output_format(ctx)
+    if output_format == 'ndjson':
+        click.echo(_to_ndjson({'error': str(message)}))
+        sys.exit(1)
+    elif output_format == 'json':
+        click.echo(_to_json({'error': str(message)}, ctx))
         sys.exit(1)
     else:
         click.echo('\x1b[2K\r', nl=False)
@@ -12,6 +12,7 @@
 # conditions of the subcomponent's license, as noted in the LICENSE file.
 #
 
+import itertools
 import os
 
 import click
@@ -21,12 +22,18 @@ from pyvcloud.vcd.client import get_links
 from pyvcloud.vcd.client import ResourceType
 from pyvcloud.vcd.org import Org
 from pyvcloud.vcd.utils import access_settings_to_dict
+from pyvcloud.vcd.utils import filter_attributes
 from pyvcloud.vcd.utils import to_dict
 from pyvcloud.vcd.utils import vapp_to_dict
 from pyvcloud.vcd.vapp import VApp
 from pyvcloud.vcd.vdc import VDC
 from pyvcloud.vcd.vm import VM
 
+from vcd_cli.href_cache import invalidate_href
+from vcd_cli.href_cache import resolve_resource
+from vcd_cli.query import count_records
+from vcd_cli.query import parse_fields
+from vcd_cli.query import query_records
 from vcd_cli.utils import access_settings_to_list
 from vcd_cli.utils import acl_str_to_list_of_dict
 from vcd_cli.utils import extract_name_and_id
@@ -318,7 +325,7 @@ def info(ctx, name):
         client = ctx.obj['client']
         vdc_href = ctx.obj['profiles'].get('vdc_href')
         vdc = VDC(client, href=vdc_href)
-        vapp_resource = vdc.get_vapp(name)
+        vapp_resource = get_vapp_resource(ctx, vdc, name)
         vapp = VApp(client, resource=vapp_resource)
         md = vapp.get_metadata()
         access_control_settings = vapp.get_access_settings()
@@ -344,7 +351,7 @@ def attach(ctx, vapp_name, vm_name, disk_name):
         disk_name, disk_id = extract_name_and_id(disk_name)
         disk = vdc.get_disk(name=disk_name, disk_id=disk_id)
 
-        vapp_resource = vdc.get_vapp(vapp_name)
+        vapp_resource = get_vapp_resource(ctx, vdc, vapp_name)
         vapp = VApp(client, resource=vapp_resource)
 
         task = vapp.attach_disk_to_vm(
@@ -369,7 +376,7 @@ def detach(ctx, vapp_name, vm_name, disk_name):
         disk_name, disk_id = extract_name_and_id(disk_name)
         disk = vdc.get_disk(name=disk_name, disk_id=disk_id)
 
-        vapp_resource = vdc.get_vapp(vapp_name)
+        vapp_resource = get_vapp_resource(ctx, vdc, vapp_name)
         vapp = VApp(client, resource=vapp_resource)
 
         task = vapp.detach_disk_from_vm(
@@ -383,12 +390,20 @@ def detach(ctx, vapp_name, vm_name, disk_name):
 @click.pass_context
 @click.argument('name', metavar='<vapp-name>', default=None, required=False)
 @click.option('--filter', 'filter', metavar='<filter>', help='filter for vapp')
-def list_vapps(ctx, name, filter):
+@click.option(
+    '--fields',
+    required=False,
+    default=None,
+    metavar='<attribute,...>',
+    help='only get these attributes of the vApps or VMs')
+@click.option(
+    '--count',
+    is_flag=True,
+    default=False,
+    help='only show the number of vApps or VMs')
+def list_vapps(ctx, name, filter, fields, count):
     try:
         restore_session(ctx, vdc_required=True)
-        client = ctx.obj['client']
-        result = []
-        records = []
         if name is None:
             if is_sysadmin(ctx):
                 resource_type = ResourceType.ADMIN_VAPP.value
@@ -417,21 +432,34 @@ def list_vapps(ctx, name, filter):
                     'storageKB', 'vdcName'
                 ]
 
-        vdc_href = ctx.obj['profiles'].get('vdc_href')
-        vdc = VDC(client, href=vdc_href)
-        records = vdc.list_vapp_details(resource_type, filter)
-
-        if len(records) == 0:
+        if count:
+            n = count_records(ctx, resource_type, qfilter=filter)
+            stdout({'count': n}, ctx, alt_text=str(n))
+            return
+        fields = parse_fields(fields)
+        if fields is not None:
+            attributes = fields
+            dict_resource_type = None
+        else:
+            dict_resource_type = resource_type
+        records = query_records(
+            ctx,
+            resource_type,
+            qfilter=filter,
+            fields=attributes or filter_attributes(resource_type))
+        first = next(records, None)
+        if first is None:
             if name is None:
                 result = 'No vApps were found.'
             else:
                 result = 'No vms were found.'
 
         else:
-            for r in records:
-                result.append(
-                    to_dict(
-                        r, resource_type=resource_type, attributes=attributes))
+            result = (to_dict(
+                r,
+                resource_type=dict_resource_type,
+                attributes=attributes)
+                for r in itertools.chain([first], records))
 
             stdout(result, ctx, show_id=False)
     except Exception as e:
@@ -572,8 +600,9 @@ def delete(ctx, name, vm_names, force):
         vdc = VDC(client, href=vdc_href)
         if len(vm_names) == 0:
             task = vdc.delete_vapp(name, force)
+            invalidate_href(ctx, 'vapp', name)
         else:
-            vapp_resource = vdc.get_vapp(name)
+            vapp_resource = get_vapp_resource(ctx, vdc, name)
             vapp = VApp(client, resource=vapp_resource)
             task = vapp.delete_vms(vm_names)
         stdout(task, ctx)
@@ -592,7 +621,7 @@ def update_lease(ctx, name, runtime_seconds, storage_seconds):
         client = ctx.obj['client']
         vdc_href = ctx.obj['profiles'].get('vdc_href')
         vdc = VDC(client, href=vdc_href)
-        vapp_resource = vdc.get_vapp(name)
+        vapp_resource = get_vapp_resource(ctx, vdc, name)
         vapp = VApp(client, resource=vapp_resource)
         if storage_seconds is None:
             storage_seconds = runtime_seconds
@@ -615,7 +644,7 @@ def change_owner(ctx, vapp_name, user_name):
         in_use_org_href = ctx.obj['profiles'].get('org_href')
         org = Org(client, in_use_org_href)
         user_resource = org.get_user(user_name)
-        vapp_resource = vdc.get_vapp(vapp_name)
+        vapp_resource = get_vapp_resource(ctx, vdc, vapp_name)
         vapp = VApp(client, resource=vapp_resource)
         vapp.change_owner(user_resource.get('href'))
         stdout('vapp owner changed', ctx)
@@ -640,7 +669,7 @@ def reboot(ctx, name, vm_names):
         client = ctx.obj['client']
         vdc_href = ctx.obj['profiles'].get('vdc_href')
         vdc = VDC(client, href=vdc_href)
-        vapp_resource = vdc.get_vapp(name)
+        vapp_resource = get_vapp_resource(ctx, vdc, name)
         vapp = VApp(client, resource=vapp_resource)
         if len(vm_names) == 0:
             task = vapp.reboot()
@@ -672,7 +701,7 @@ def power_off(ctx, name, vm_names):
         client = ctx.obj['client']
         vdc_href = ctx.obj['profiles'].get('vdc_href')
         vdc = VDC(client, href=vdc_href)
-        vapp_resource = vdc.get_vapp(name)
+        vapp_resource = get_vapp_resource(ctx, vdc, name)
         vapp = VApp(client, resource=vapp_resource)
         if len(vm_names) == 0:
             task = vapp.power_off()
@@ -703,7 +732,7 @@ def reset(ctx, name, vm_names):
         client = ctx.obj['client']
         vdc_href = ctx.obj['profiles'].get('vdc_href')
         vdc = VDC(client, href=vdc_href)
-        vapp_resource = vdc.get_vapp(name)
+        vapp_resource = get_vapp_resource(ctx, vdc, name)
         vapp = VApp(client, resource=vapp_resource)
         if len(vm_names) == 0:
             task = vapp.power_reset()
@@ -737,7 +766,7 @@ def deploy(ctx, name, vm_names, power_on, force_customization):
         client = ctx.obj['client']
         vdc_href = ctx.obj['profiles'].get('vdc_href')
         vdc = VDC(client, href=vdc_href)
-        vapp_resource = vdc.get_vapp(name)
+        vapp_resource = get_vapp_resource(ctx, vdc, name)
         vapp = VApp(client, resource=vapp_resource)
         if power_on is not None:
             power_on = False
@@ -780,7 +809,7 @@ def undeploy(ctx, name, vm_names, action):
         client = ctx.obj['client']
         vdc_href = ctx.obj['profiles'].get('vdc_href')
         vdc = VDC(client, href=vdc_href)
-        vapp_resource = vdc.get_vapp(name)
+        vapp_resource = get_vapp_resource(ctx, vdc, name)
         vapp = VApp(client, resource=vapp_resource)
         if len(vm_names) == 0:
             task = vapp.undeploy(action)
@@ -818,7 +847,7 @@ def power_on(ctx, name, vm_names):
         client = ctx.obj['client']
         vdc_href = ctx.obj['profiles'].get('vdc_href')
         vdc = VDC(client, href=vdc_href)
-        vapp_resource = vdc.get_vapp(name)
+        vapp_resource = get_vapp_resource(ctx, vdc, name)
         vapp = VApp(client, resource=vapp_resource)
         if len(vm_names) == 0:
             task = vapp.power_on()
@@ -850,7 +879,7 @@ def shutdown(ctx, name, vm_names):
         client = ctx.obj['client']
         vdc_href = ctx.obj['profiles'].get('vdc_href')
         vdc = VDC(client, href=vdc_href)
-        vapp_resource = vdc.get_vapp(name)
+        vapp_resource = get_vapp_resource(ctx, vdc, name)
         vapp = VApp(client, resource=vapp_resource)
         if len(vm_names) == 0:
             task = vapp.shutdown()
@@ -987,7 +1016,7 @@ def connect(ctx, name, network, retain_ip, is_deployed):
         client = ctx.obj['client']
         vdc_href = ctx.obj['profiles'].get('vdc_href')
         vdc = VDC(client, href=vdc_href)
-        vapp_resource = vdc.get_vapp(name)
+        vapp_resource = get_vapp_resource(ctx, vdc, name)
         vapp = VApp(client, resource=vapp_resource)
         task = vapp.connect_org_vdc_network(
             network, retain_ip=retain_ip, is_deployed=is_deployed)
@@ -1015,7 +1044,7 @@ def disconnect(ctx, name, network):
         client = ctx.obj['client']
         vdc_href = ctx.obj['profiles'].get('vdc_href')
         vdc = VDC(client, href=vdc_href)
-        vapp_resource = vdc.get_vapp(name)
+        vapp_resource = get_vapp_resource(ctx, vdc, name)
         vapp = VApp(client, resource=vapp_resource)
         task = vapp.disconnect_org_vdc_network(network)
         stdout(task, ctx)
@@ -1051,7 +1080,7 @@ def capture(ctx, name, catalog, template, customizable, description):
         catalog_resource = org.get_catalog(catalog)
         vdc_href = ctx.obj['profiles'].get('vdc_href')
         vdc = VDC(client, href=vdc_href)
-        vapp_resource = vdc.get_vapp(name)
+        vapp_resource = get_vapp_resource(ctx, vdc, name)
         overwrite = False
         if template is None:
             template = vapp_resource.get('name')
@@ -1088,7 +1117,7 @@ def add_disk(ctx, name, vm_name, size, storage_profile):
         client = ctx.obj['client']
         vdc_href = ctx.obj['profiles'].get('vdc_href')
         vdc = VDC(client, href=vdc_href)
-        vapp_resource = vdc.get_vapp(name)
+        vapp_resource = get_vapp_resource(ctx, vdc, name)
         vapp = VApp(client, resource=vapp_resource)
         task = vapp.add_disk_to_vm(vm_name, size)
         stdout(task, ctx)
@@ -1107,10 +1136,12 @@ def use(ctx, name):
         in_use_vdc_name = ctx.obj['profiles'].get('vdc_in_use')
         vdc_href = ctx.obj['profiles'].get('vdc_href')
         vdc = VDC(client, href=vdc_href)
-        vapp_resource = vdc.get_vapp(name)
+        vapp_resource = get_vapp_resource(ctx, vdc, name)
         vapp = VApp(client, resource=vapp_resource)
-        ctx.obj['profiles'].set('vapp_in_use', str(name))
-        ctx.obj['profiles'].set('vapp_href', str(vapp.href))
+        profiles = ctx.obj['profiles']
+        with profiles.transaction():
+            profiles.set('vapp_in_use', str(name))
+            profiles.set('vapp_href', str(vapp.href))
         message = 'now using org: \'%s\', vdc: \'%s\', vApp: \'%s\'.' % \
                   (in_use_org_name, in_use_vdc_name, name)
         stdout({
@@ -1176,13 +1207,13 @@ def add_vm(ctx, name, source_vapp, source_vm, catalog, target_vm, hostname,
         vdc = VDC(client, href=vdc_href)
         source_vapp_resource = None
         if catalog is None:
-            source_vapp_resource = vdc.get_vapp(source_vapp)
+            source_vapp_resource = get_vapp_resource(ctx, vdc, source_vapp)
         else:
             catalog_item = org.get_catalog_item(catalog, source_vapp)
             source_vapp_resource = client.get_resource(
                 catalog_item.Entity.get('href'))
         assert source_vapp_resource is not None
-        vapp_resource = vdc.get_vapp(name)
+        vapp_resource = get_vapp_resource(ctx, vdc, name)
         vapp = VApp(client, resource=vapp_resource)
         spec = {'source_vm_name': source_vm, 'vapp': source_vapp_resource}
         if target_vm is not None:
@@ -1248,7 +1279,7 @@ def add(ctx, vapp_name, access_list):
         client = ctx.obj['client']
         vdc_href = ctx.obj['profiles'].get('vdc_href')
         vdc = VDC(client, href=vdc_href)
-        vapp = VApp(client, resource=vdc.get_vapp(vapp_name))
+        vapp = VApp(client, resource=get_vapp_resource(ctx, vdc, vapp_name))
 
         vapp.add_access_settings(
             access_settings_list=acl_str_to_list_of_dict(access_list))
@@ -1286,7 +1317,7 @@ def remove(ctx, vapp_name, access_list, all):
         client = ctx.obj['client']
         vdc_href = ctx.obj['profiles'].get('vdc_href')
         vdc = VDC(client, href=vdc_href)
-        vapp = VApp(client, resource=vdc.get_vapp(vapp_name))
+        vapp = VApp(client, resource=get_vapp_resource(ctx, vdc, vapp_name))
 
         vapp.remove_access_settings(
             access_settings_list=acl_str_to_list_of_dict(access_list),
@@ -1315,7 +1346,7 @@ def share(ctx, vapp_name, access_level):
         client = ctx.obj['client']
         vdc_href = ctx.obj['profiles'].get('vdc_href')
         vdc = VDC(client, href=vdc_href)
-        vapp = VApp(client, resource=vdc.get_vapp(vapp_name))
+        vapp = VApp(client, resource=get_vapp_resource(ctx, vdc, vapp_name))
 
         vapp.share_with_org_members(everyone_access_level=access_level)
         stdout(
@@ -1335,7 +1366,7 @@ def unshare(ctx, vapp_name):
         client = ctx.obj['client']
         vdc_href = ctx.obj['profiles'].get('vdc_href')
         vdc = VDC(client, href=vdc_href)
-        vapp = VApp(client, resource=vdc.get_vapp(vapp_name))
+        vapp = VApp(client, resource=get_vapp_resource(ctx, vdc, vapp_name))
 
         vapp.unshare_from_org_members()
         stdout(
@@ -1354,7 +1385,7 @@ def list_acl(ctx, vapp_name):
         client = ctx.obj['client']
         vdc_href = ctx.obj['profiles'].get('vdc_href')
         vdc = VDC(client, href=vdc_href)
-        vapp = VApp(client, resource=vdc.get_vapp(vapp_name))
+        vapp = VApp(client, resource=get_vapp_resource(ctx, vdc, vapp_name))
 
         acl = vapp.get_access_settings()
         stdout(
@@ -1386,6 +1417,7 @@ def update_vapp(ctx, vapp_name, name, description):
         vapp = get_vapp(ctx, vapp_name)
 
         task = vapp.edit_name_and_description(name, description)
+        invalidate_href(ctx, 'vapp', vapp_name)
         stdout(task, ctx)
     except Exception as e:
         stderr(e, ctx)
@@ -1474,6 +1506,7 @@ def move_to(ctx, vapp_name, vdc):
         if vdc_href is not None:
             vapp = get_vapp(ctx, vapp_name)
             task = vapp.move_to(vdc_href)
+            invalidate_href(ctx, 'vapp', vapp_name)
             stdout(task, ctx)
         else:
             stdout('Org vdc not found', ctx)
@@ -1880,4 +1913,10 @@ def get_vapp(ctx, vapp_name):
     client = ctx.obj['client']
     vdc_href = ctx.obj['profiles'].get('vdc_href')
     vdc = VDC(client, href=vdc_href)
-    return VApp(client, resource=vdc.get_vapp(vapp_name))
+    return VApp(client, resource=get_vapp_resource(ctx, vdc, vapp_name))
+
+
+def get_vapp_resource(ctx, vdc, vapp_name):
+    """Get the vApp resource, using its cached href."""
+    return resolve_resource(ctx, 'vapp', vapp_name,
+                            lambda: vdc.get_vapp(vapp_name))
@@ -161,10 +161,12 @@ def use(ctx, name):
                         vapp_in_use = ''
                         vapp_href = ''
                         client.get_resource(link.href)
-                        ctx.obj['profiles'].set('vdc_in_use', vdc_in_use)
-                        ctx.obj['profiles'].set('vdc_href', str(link.href))
-                        ctx.obj['profiles'].set('vapp_in_use', vapp_in_use)
-                        ctx.obj['profiles'].set('vapp_href', vapp_href)
+                        profiles = ctx.obj['profiles']
+                        with profiles.transaction():
+                            profiles.set('vdc_in_use', vdc_in_use)
+                            profiles.set('vdc_href', str(link.href))
+                            profiles.set('vapp_in_use', vapp_in_use)
+                            profiles.set('vapp_href', vapp_href)
                         message = 'now using org: \'%s\', vdc: \'%s\', vApp:' \
                                   ' \'%s\'.' % (in_use_org_name, vdc_in_use,
                                                 vapp_in_use)
@@ -12,21 +12,41 @@
 # conditions of the subcomponent's license, as noted in the LICENSE file.
 #
 
+import itertools
+import urllib.parse
+
 import click
 from pyvcloud.vcd.client import IpAddressMode
 from pyvcloud.vcd.client import MetadataDomain
 from pyvcloud.vcd.client import NetworkAdapterType
+from pyvcloud.vcd.client import QueryResultFormat
+from pyvcloud.vcd.client import ResourceType
+from pyvcloud.vcd.exceptions import EntityNotFoundException
+from pyvcloud.vcd.exceptions import MultipleRecordsException
 from pyvcloud.vcd.utils import metadata_to_dict
+from pyvcloud.vcd.utils import to_dict
 from pyvcloud.vcd.utils import vm_to_dict
 from pyvcloud.vcd.vapp import VApp
 from pyvcloud.vcd.vdc import VDC
 from pyvcloud.vcd.vm import VM
 
+from vcd_cli.href_cache import execute_typed_query
+from vcd_cli.href_cache import resolve_resource
+from vcd_cli.query import count_records
+from vcd_cli.query import join_filters
+from vcd_cli.query import parse_fields
+from vcd_cli.query import query_records
 from vcd_cli.utils import restore_session
 from vcd_cli.utils import stderr
 from vcd_cli.utils import stdout
 from vcd_cli.vcd import vcd
 
+# Attributes shown by 'vm list' by default.
+VM_LIST_FIELDS = [
+    'name', 'containerName', 'status', 'numberOfCpus', 'memoryMB',
+    'guestOs'
+]
+
 
 @vcd.group(short_help='manage VMs')
 @click.pass_context
@@ -356,9 +376,126 @@ def vm(ctx):
 
 @vm.command('list', short_help='list VMs')
 @click.pass_context
-def list_vms(ctx):
+@click.option(
+    '-a',
+    '--vapp',
+    'vapp_name',
+    required=False,
+    default=None,
+    metavar='<vapp-name>',
+    help='only list the VMs of this vApp')
+@click.option(
+    '-s',
+    '--status',
+    required=False,
+    default=None,
+    metavar='<status>',
+    help='only list the VMs with this status, like POWERED_ON')
+@click.option(
+    '-f',
+    '--filter',
+    'query_filter',
+    required=False,
+    default=None,
+    metavar='<query-filter>',
+    help='query filter, like \'numberOfCpus=gt=4\'')
+@click.option(
+    '--sort-asc',
+    required=False,
+    default=None,
+    metavar='<attribute>',
+    help='sort by this attribute in ascending order (default: name)')
+@click.option(
+    '--sort-desc',
+    required=False,
+    default=None,
+    metavar='<attribute>',
+    help='sort by this attribute in descending order')
+@click.option(
+    '--fields',
+    required=False,
+    default=','.join(VM_LIST_FIELDS),
+    show_default=True,
+    metavar='<attribute,...>',
+    help='attributes to show')
+@click.option(
+    '-l',
+    '--limit',
+    type=click.IntRange(0),
+    required=False,
+    default=None,
+    metavar='<number>',
+    help='maximum number of VMs to list')
+@click.option(
+    '--count',
+    is_flag=True,
+    default=False,
+    help='only show the number of VMs')
+def list_vms(ctx, vapp_name, status, query_filter, sort_asc, sort_desc,
+             fields, limit, count):
+    """List the VMs in the current virtual datacenter.
+
+\b
+    Description
+        VMs are queried, filtered and sorted by vCloud Director. They are
+        printed a page at a time while the query runs, the width of the
+        columns is taken from the first rows.
+\b
+        Filter values must be url-encoded, see 'vcd search'.
+\b
+    Examples
+        vcd vm list
+            List the VMs in the current virtual datacenter.
+\b
+        vcd vm list --vapp vapp1
+            List the VMs in vApp 'vapp1'.
+\b
+        vcd vm list --status POWERED_OFF --sort-desc memoryMB --limit 10
+            List the 10 powered off VMs with the most memory.
+\b
+        vcd vm list --status POWERED_ON --count
+            Count the powered on VMs.
+\b
+        vcd vm list --filter 'numberOfCpus=gt=4' --fields name,numberOfCpus
+            List the name and number of CPUs of the VMs with more than 4
+            CPUs.
+    """
     try:
-        raise Exception('not implemented')
+        restore_session(ctx, vdc_required=True)
+        client = ctx.obj['client']
+        if client.is_sysadmin():
+            resource_type = ResourceType.ADMIN_VM.value
+        else:
+            resource_type = ResourceType.VM.value
+        vdc_href = ctx.obj['profiles'].get('vdc_href')
+        qfilter = join_filters(
+            'vdc==%s' % urllib.parse.quote(vdc_href),
+            'isVAppTemplate==false',
+            None if vapp_name is None else 'containerName==%s' %
+            urllib.parse.quote(vapp_name, safe=''),
+            None if status is None else 'status==%s' % status.upper(),
+            query_filter)
+        if count:
+            n = count_records(ctx, resource_type, qfilter=qfilter)
+            stdout({'count': n}, ctx, alt_text=str(n))
+            return
+        if sort_asc is None and sort_desc is None:
+            sort_asc = 'name'
+        fields = parse_fields(fields)
+        records = query_records(
+            ctx,
+            resource_type,
+            qfilter=qfilter,
+            sort_asc=sort_asc,
+            sort_desc=sort_desc,
+            fields=fields,
+            limit=limit)
+        first = next(records, None)
+        if first is None:
+            stdout('No VMs were found.', ctx)
+        else:
+            stdout((to_dict(r, attributes=fields)
+                    for r in itertools.chain([first], records)), ctx)
     except Exception as e:
         stderr(e, ctx)
 
@@ -373,15 +510,41 @@ def _get_vdc(ctx):
 def _get_vapp(ctx, vapp_name):
     client = ctx.obj['client']
     vdc = _get_vdc(ctx)
-    vapp_resource = vdc.get_vapp(vapp_name)
+    vapp_resource = resolve_resource(ctx, 'vapp', vapp_name,
+                                     lambda: vdc.get_vapp(vapp_name))
     return VApp(client, resource=vapp_resource)
 
 
 def _get_vm(ctx, vapp_name, vm_name):
+    """Get the VM with the given name in the vApp of the vdc in use.
+
+    The VM is found with a single query instead of fetching the vdc and the
+    vApp, which can be large.
+    """
     client = ctx.obj['client']
-    vapp = _get_vapp(ctx, vapp_name)
-    vm_resource = vapp.get_vm(vm_name)
-    return VM(client, href=vm_resource.get('href'))
+    vdc_href = ctx.obj['profiles'].get('vdc_href')
+    if client.is_sysadmin():
+        resource_type = ResourceType.ADMIN_VM.value
+    else:
+        resource_type = ResourceType.VM.value
+    qfilter = 'vdc==%s;containerName==%s;isVAppTemplate==false' % (
+        urllib.parse.quote(vdc_href), urllib.parse.quote(vapp_name, safe=''))
+    records = list(
+        execute_typed_query(
+            ctx,
+            resource_type,
+            query_result_format=QueryResultFormat.RECORDS,
+            qfilter=qfilter,
+            equality_filter=('name', vm_name),
+            fields='name'))
+    if len(records) == 0:
+        raise EntityNotFoundException(
+            'VM \'%s\' not found in vApp \'%s\'.' % (vm_name, vapp_name))
+    elif len(records) > 1:
+        raise MultipleRecordsException(
+            'Found multiple VMs named \'%s\' in vApp \'%s\'.' %
+            (vm_name, vapp_name))
+    return VM(client, href=records[0].get('href'))
 
 
 @vm.command(short_help='show VM details')